@@ -1,62 +1,324 @@
+"""
+Find which frame of the full video (folder1) each frame of the subset (folder2) is.
+
+Every frame of both folders gets a 64-bit perceptual hash (DCT hash of a 32x32 grayscale
+thumbnail). The subset hashes go into a BK-tree, so the candidates for a frame of folder1 are only
+the subset frames within a small Hamming distance of its hash. The top-k of those, closest first,
+are confirmed with SSIM.
+
+The subset folder is decoded once into a read-only (M, H, W) grayscale array, optionally downscaled,
+that all workers share. The frames of folder1 are then streamed past it, each decoded once.
+
+With --mode sequential the subset is assumed to be an ordered subsequence of the video. Each frame
+of folder1 is then only compared with the next few unmatched subset frames (--band), so the whole
+mapping takes O(N + M) comparisons. Subset frames the pass skips are looked up among all frames
+afterwards and reported as out of order if they are found elsewhere, or as missing otherwise.
+
+The index mode runs on a pool of threads or, with --executor process, on a pool of processes. SSIM
+holds the GIL for much of its work, so processes scale better on many cores. They map the decoded
+candidates from shared memory instead of receiving a pickled copy, and take the frames of folder1 in
+chunks of --chunk_size.
+
+Example:
+    python frame_matching.py combined_video_frames/images subset_combined_video_frames --top_k 5
+"""
+
 import os
+import time
+import argparse
 import cv2
+import numpy as np
 from skimage.metrics import structural_similarity as ssim
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from multiprocessing import get_context, shared_memory
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
-# Folder paths
-folder1 = 'combined_video_frames/images'
-folder2 = 'subset_combined_video_frames'
+# Default folder paths
+FOLDER1 = 'combined_video_frames/images'
+FOLDER2 = 'subset_combined_video_frames'
+# Side of the grayscale thumbnail the hash is computed from, and of the block of DCT
+# coefficients kept (HASH_SIZE^2 bits)
+HASH_IMAGE_SIZE = 32
+HASH_SIZE = 8
 
-# Function to load images
-def load_image(filepath):
+# Function to load images, downscaled by an integer factor
+def load_image(filepath, downscale=1):
     img = cv2.imread(filepath)
     if img is None:
         raise ValueError(f"Image at {filepath} could not be loaded.")
-    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if downscale > 1:
+        height, width = img.shape
+        img = cv2.resize(img, (width // downscale, height // downscale), interpolation=cv2.INTER_AREA)
+    return img
 
 # Function to compare two images using SSIM
 def compare_images(img1, img2):
     return ssim(img1, img2)
 
-# Function to compare one image from folder1 with all images from folder2
-def compare_with_all_images(img1_name):
-    print(f"Comparing {img1_name} from folder1...")  # Print which image is being processed
-    img1_path = os.path.join(folder1, img1_name)
-    img1 = load_image(img1_path)
+# Function to compute the perceptual hash of a grayscale image, as an int
+def perceptual_hash(img):
+    thumbnail = cv2.resize(img, (HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(thumbnail.astype(np.float32))[:HASH_SIZE, :HASH_SIZE]
+    # Compare the low frequencies with their median, leaving out the DC term (overall brightness)
+    bits = (dct > np.median(dct.flatten()[1:])).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
 
-    for img2_name in images_folder2:
-        img2_path = os.path.join(folder2, img2_name)
-        img2 = load_image(img2_path)
+# Number of differing bits between two hashes
+def hamming_distance(hash1, hash2):
+    return bin(hash1 ^ hash2).count('1')
 
-        # Compare the images
-        similarity = compare_images(img1, img2)
+class BKTree:
+    """
+    Burkhard-Keller tree over hashes, for finding every hash within a Hamming distance of a query
+    without comparing it to all of them. Each node holds a hash, the labels of the frames with that
+    hash, and its children keyed by their distance to it.
+    """
 
-        if similarity > 0.99:  # Threshold for matching
-            print(f"Image {img1_name} in folder1 matches with {img2_name} in folder2.")
-            return (img1_name, img2_name)  # Return the match once found
+    def __init__(self):
+        self.root = None
+        self.size = 0
 
-    return (img1_name, None)  # Return None if no match is found
+    def add(self, hash_value, name):
+        self.size += 1
+        if self.root is None:
+            self.root = (hash_value, [name], {})
+            return
+        node = self.root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            if distance == 0:
+                node[1].append(name)
+                return
+            if distance not in node[2]:
+                node[2][distance] = (hash_value, [name], {})
+                return
+            node = node[2][distance]
+
+    def search(self, hash_value, max_distance):
+        """All (distance, label) pairs within max_distance of hash_value, closest first."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_hash, names, children = stack.pop()
+            distance = hamming_distance(hash_value, node_hash)
+            if distance <= max_distance:
+                found.extend((distance, name) for name in names)
+            # By the triangle inequality, only children this close to the node can be in range
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(found)
 
 # Adjusted sorting function to handle filenames
-images_folder1 = sorted(os.listdir(folder1), key=lambda x: int(x.split('_')[-1].split('.')[0]))
-images_folder2 = sorted(os.listdir(folder2), key=lambda x: int(x.split('_')[-1].split('.')[0]))
+def sorted_frames(folder):
+    return sorted(os.listdir(folder), key=lambda x: int(x.split('_')[-1].split('.')[0]))
+
+# Function to decode every candidate image once into one read-only (M, H, W) grayscale array
+def load_candidates(folder, names, downscale=1, num_workers=None):
+    first = load_image(os.path.join(folder, names[0]), downscale)
+    candidates = np.empty((len(names),) + first.shape, dtype=np.uint8)
+
+    def decode(i):
+        img = load_image(os.path.join(folder, names[i]), downscale)
+        if img.shape != first.shape:
+            raise ValueError(f"Image {names[i]} has shape {img.shape}, expected {first.shape}.")
+        candidates[i] = img
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        list(executor.map(decode, range(len(names))))
+    candidates.flags.writeable = False
+    return candidates
+
+# Function to decode the images of a folder in order, a few ahead of the one being used
+def iter_images(folder, names, downscale=1, num_workers=None):
+    lookahead = 2 * (num_workers or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        pending = deque()
+        for name in names:
+            pending.append(executor.submit(load_image, os.path.join(folder, name), downscale))
+            if len(pending) > lookahead:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Function to build the hash index of the candidate frames, keyed by their row in the array
+def build_index(candidates):
+    index = BKTree()
+    for row, img in enumerate(candidates):
+        index.add(perceptual_hash(img), row)
+    return index
+
+# Function to find the match of one image from folder1 among the hash candidates from folder2
+def match_image(img1_name, folder1, images_folder2, candidates, index, top_k=5, max_distance=10,
+                threshold=0.99, downscale=1):
+    print(f"Comparing {img1_name} from folder1...")  # Print which image is being processed
+    img1 = load_image(os.path.join(folder1, img1_name), downscale)
+
+    for distance, row in index.search(perceptual_hash(img1), max_distance)[:top_k]:
+        # Confirm the candidate with SSIM
+        similarity = compare_images(img1, candidates[row])
+
+        if similarity > threshold:  # Threshold for matching
+            print(f"Image {img1_name} in folder1 matches with {images_folder2[row]} in folder2.")
+            return (img1_name, images_folder2[row])  # Return the match once found
+
+    return (img1_name, None)  # Return None if no match is found
+
+# Matching settings, candidates and hash index of the current worker (thread or process)
+worker_state = {}
+
+def init_thread_worker(state):
+    worker_state.update(state)
+
+def init_process_worker(shm_name, shape, state):
+    # One OpenCV thread per process, the pool already uses every core
+    cv2.setNumThreads(1)
+    # Attaching registers the segment with the parent's resource tracker again, which is harmless: the
+    # tracker keeps a set of names and the parent unregisters it when unlinking
+    shm = shared_memory.SharedMemory(name=shm_name)
+    candidates = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    candidates.flags.writeable = False
+    worker_state.update(state, shm=shm, candidates=candidates)
+
+# Function to match a chunk of images from folder1 in a worker
+def match_chunk(img1_names):
+    state = worker_state
+    return [
+        match_image(img1_name, state['folder1'], state['images_folder2'], state['candidates'], state['index'],
+                    state['top_k'], state['max_distance'], state['threshold'], state['downscale'])
+        for img1_name in img1_names
+    ]
+
+# Function to match every image of folder1 to an image of folder2
+def match_folders(folder1, folder2, top_k=5, max_distance=10, threshold=0.99, num_workers=None, downscale=1,
+                  executor='thread', chunk_size=16):
+    images_folder1 = sorted_frames(folder1)
+    images_folder2 = sorted_frames(folder2)
+    candidates = load_candidates(folder2, images_folder2, downscale, num_workers)
+    index = build_index(candidates)
+    state = {'folder1': folder1, 'images_folder2': images_folder2, 'index': index, 'top_k': top_k,
+             'max_distance': max_distance, 'threshold': threshold, 'downscale': downscale}
+
+    shm = None
+    if executor == 'process':
+        # Copy the candidates into shared memory once, every worker process maps the same pages
+        shm = shared_memory.SharedMemory(create=True, size=max(candidates.nbytes, 1))
+        np.ndarray(candidates.shape, dtype=np.uint8, buffer=shm.buf)[...] = candidates
+        pool = ProcessPoolExecutor(max_workers=num_workers, mp_context=get_context('spawn'),
+                                   initializer=init_process_worker, initargs=(shm.name, candidates.shape, state))
+        del candidates
+    else:
+        state['candidates'] = candidates
+        pool = ThreadPoolExecutor(max_workers=num_workers, initializer=init_thread_worker, initargs=(state,))
 
-# Dictionary to store the matching indices
-matches = {}
+    # Stream folder1 past the candidates in chunks, reporting progress as chunks finish
+    results = {}
+    start = time.perf_counter()
+    try:
+        with pool:
+            futures = [pool.submit(match_chunk, images_folder1[i:i + chunk_size])
+                       for i in range(0, len(images_folder1), chunk_size)]
+            for future in as_completed(futures):
+                results.update(future.result())
+                elapsed = time.perf_counter() - start
+                print(f"Matched {len(results)}/{len(images_folder1)} frames "
+                      f"({len(results) / elapsed:.1f} frames/s)")
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
 
-# Use ThreadPoolExecutor to parallelize the comparison
-with ThreadPoolExecutor() as executor:
-    results = executor.map(compare_with_all_images, images_folder1)
+    # Dictionary to store the matching indices, in folder1 order
+    matches = {}
+    for img1_name in images_folder1:
+        if results[img1_name]:
+            matches[img1_name] = results[img1_name]
+    return matches
 
-# Collect results
-for img1_name, img2_name in results:
-    if img2_name:
-        matches[img1_name] = img2_name
+# Function to align folder1 with the ordered subset in folder2 in one pass
+def align_sequential(folder1, folder2, band=8, top_k=5, max_distance=10, threshold=0.99, num_workers=None,
+                     downscale=1):
+    images_folder1 = sorted_frames(folder1)
+    images_folder2 = sorted_frames(folder2)
+    candidates = load_candidates(folder2, images_folder2, downscale, num_workers)
+    candidate_hashes = [perceptual_hash(img) for img in candidates]
 
-# Output the matching results
-print("Matches found:", matches)
+    # Subset row -> index of its frame in folder1, -1 while unmatched
+    mapping = np.full(len(images_folder2), -1)
+    query_hashes = []
+    next_row = 0
+    for i, img1 in enumerate(iter_images(folder1, images_folder1, downscale, num_workers)):
+        query_hashes.append(perceptual_hash(img1))
+        # Only the next band subset frames can come up, closest hash first
+        band_rows = range(next_row, min(next_row + band, len(candidates)))
+        close = sorted((hamming_distance(query_hashes[i], candidate_hashes[row]), row) for row in band_rows)
+        for distance, row in close[:top_k]:
+            if distance > max_distance:
+                break
+            if compare_images(img1, candidates[row]) > threshold:
+                print(f"Image {images_folder1[i]} in folder1 matches with {images_folder2[row]} in folder2.")
+                mapping[row] = i
+                next_row = row + 1
+                break
 
+    # Look up the subset frames the pass skipped among all frames of folder1
+    query_index = BKTree()
+    for i, hash_value in enumerate(query_hashes):
+        query_index.add(hash_value, i)
+    out_of_order = []
+    missing = []
+    for row in np.where(mapping < 0)[0]:
+        found = None
+        for distance, i in query_index.search(candidate_hashes[row], max_distance)[:top_k]:
+            if compare_images(load_image(os.path.join(folder1, images_folder1[i]), downscale), candidates[row]) > threshold:
+                found = i
+                break
+        if found is None:
+            missing.append(images_folder2[row])
+            continue
+        # The frame is in order if it lies between the matches of its neighbours
+        before = mapping[:row][mapping[:row] >= 0]
+        after = mapping[row + 1:][mapping[row + 1:] >= 0]
+        if (len(before) == 0 or before[-1] < found) and (len(after) == 0 or found < after[0]):
+            mapping[row] = found
+        else:
+            out_of_order.append((images_folder2[row], images_folder1[found]))
 
+    matches = {images_folder1[i]: images_folder2[row] for row, i in enumerate(mapping) if i >= 0}
+    return matches, mapping, missing, out_of_order
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Match the frames of a video to a subset of its frames.")
+    parser.add_argument('folder1', type=str, nargs='?', default=FOLDER1, help="Folder with all frames")
+    parser.add_argument('folder2', type=str, nargs='?', default=FOLDER2, help="Folder with the subset of frames")
+    parser.add_argument('--mode', type=str, default='index', choices=['index', 'sequential'],
+                        help="Search every subset frame through the hash index, or align the ordered subset")
+    parser.add_argument('--band', type=int, default=8,
+                        help="Sequential mode: upcoming subset frames each frame is compared with")
+    parser.add_argument('--top_k', type=int, default=5, help="Candidates per frame confirmed with SSIM")
+    parser.add_argument('--max_distance', type=int, default=10,
+                        help=f"Largest Hamming distance (out of {HASH_SIZE ** 2} bits) of a candidate's hash")
+    parser.add_argument('--threshold', type=float, default=0.99, help="SSIM a match must exceed")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker threads or processes")
+    parser.add_argument('--executor', type=str, default='thread', choices=['thread', 'process'],
+                        help="Index mode: match on a pool of threads or of processes")
+    parser.add_argument('--chunk_size', type=int, default=16,
+                        help="Index mode: frames of folder1 per worker task")
+    parser.add_argument('--downscale', type=int, default=1,
+                        help="Compare frames at 1/downscale resolution (SSIM scores change with it)")
+    args = parser.parse_args()
 
+    if args.mode == 'sequential':
+        matches, mapping, missing, out_of_order = align_sequential(
+            args.folder1, args.folder2, args.band, args.top_k, args.max_distance, args.threshold, args.workers,
+            args.downscale)
+        print("Subset frame -> frame index:", mapping.tolist())
+        print(f"Missing subset frames ({len(missing)}):", missing)
+        print(f"Out of order subset frames ({len(out_of_order)}):", dict(out_of_order))
+    else:
+        matches = match_folders(args.folder1, args.folder2, args.top_k, args.max_distance, args.threshold,
+                                args.workers, args.downscale, args.executor, args.chunk_size)
 
+    # Output the matching results
+    print("Matches found:", matches)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Evaluate the renders of many experiments against the same eval images in one run.
+
+The ground truth frames are decoded (or memory-mapped from the frame store) once, and the
+evaluation backend with its LPIPS networks is created once. Every render folder is then streamed
+past them and written to its own csv in the output folder, named after the render folder
+(e.g. results/3p_katna_nerfacto.csv).
+
+Example:
+    ./batch_eval.py results/pepperwood_preserve_fall "renders/*p_*_nerfacto" renders/10p_random_splatfacto
+"""
+
+import os
+import glob
+import argparse
+import traceback
+
+import numpy as np
+
+from utils import get_config
+from frame_loader import FrameLoader, downscale
+from eval_pipeline import (
+    add_eval_arguments,
+    create_backend,
+    EVAL_FRAME_NUMBERS,
+    list_image_files,
+    load_eval_images,
+    preview_decode_scale,
+    result_columns,
+    save_results,
+    save_to_results_store,
+    score_rows,
+)
+
+
+def expand_render_dirs(patterns):
+    """Expand glob patterns into a sorted, de-duplicated list of render folders."""
+    render_dirs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            print(f"Warning: '{pattern}' does not match any folder")
+        for match in matches:
+            if os.path.isdir(match) and match not in render_dirs:
+                render_dirs.append(match)
+    return render_dirs
+
+
+def eval_experiment(render_dir, eval_images, eval_frame_nums, backend, args, decode_scale=1):
+    """
+    Score one render folder against the resident eval images, decoding the renders at
+    1/decode_scale resolution. Returns its result rows.
+    """
+    # Reversing the predicted images to match eval images order
+    pred_paths, pred_frame_nums = list_image_files(render_dir, reverse=True)
+    if len(pred_paths) != len(eval_images):
+        raise ValueError(
+            f"Image count mismatch: {len(pred_paths)} predicted images vs {len(eval_images)} eval images. "
+            "Ensure the render and eval folders contain the same number of frames."
+        )
+    if not np.array_equal(pred_frame_nums, eval_frame_nums):
+        print("Warning: Frame numbers do not match after alignment!")
+
+    rows = []
+    loader = FrameLoader(pred_paths, args.stream_chunk_size, args.decode_workers, decode_scale)
+    for start, pred in loader:
+        pred = downscale(pred, args.scale // decode_scale)
+        gt = eval_images[start : start + len(pred)]
+        if pred.shape[1:] != gt.shape[1:]:
+            raise ValueError(
+                f"Image resolution mismatch: predicted {pred.shape[1:]} vs eval {gt.shape[1:]}. "
+                "Images must have the same dimensions."
+            )
+        rows.append(score_rows(pred, gt, args, backend))
+    return np.concatenate(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate the renders of many experiments against the same eval images."
+    )
+    parser.add_argument("output_dir", type=str, help="Folder for the per-experiment csv files")
+    parser.add_argument(
+        "render_dirs",
+        type=str,
+        nargs="+",
+        help="Render folders or glob patterns, one experiment per folder",
+    )
+    add_eval_arguments(parser)
+    args = parser.parse_args()
+
+    config = get_config()
+
+    render_dirs = expand_render_dirs(args.render_dirs)
+    if not render_dirs:
+        raise ValueError("No render folders found")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Load the eval images and create the backend once for all experiments
+    eval_images_path = os.path.join(config["proj_dir"], config["eval_images"])
+    print(f"Loading eval images from {eval_images_path}...")
+    # One decode scale for every folder, so all renders are shrunk like the shared eval images
+    decode_scale = preview_decode_scale(
+        args,
+        list_image_files(eval_images_path, frame_numbers=EVAL_FRAME_NUMBERS)[0],
+        *(list_image_files(render_dir)[0] for render_dir in render_dirs),
+    )
+    eval_images, eval_frame_nums = load_eval_images(eval_images_path, args, decode_scale)
+    print(f"Eval images shape: {eval_images.shape}")
+    backend = create_backend(args)
+
+    failed = []
+    try:
+        for i, render_dir in enumerate(render_dirs):
+            experiment_name = os.path.basename(os.path.normpath(render_dir))
+            output_csv = os.path.join(args.output_dir, f"{experiment_name}.csv")
+            print(f"[{i + 1}/{len(render_dirs)}] Evaluating {experiment_name}...")
+            try:
+                data = eval_experiment(
+                    render_dir, eval_images, eval_frame_nums, backend, args, decode_scale
+                )
+            except Exception as e:
+                # Keep going so one bad render folder does not cost the rest of the sweep
+                print(f"Error occurred while evaluating {experiment_name}: {e}")
+                traceback.print_exc()
+                failed.append(experiment_name)
+                continue
+            save_results(output_csv, data, result_columns(args))
+            print(f"Saved evaluation results to {output_csv}")
+            save_to_results_store(args, experiment_name, eval_frame_nums, data)
+    finally:
+        if backend is not None:
+            backend.close()
+
+    if failed:
+        raise RuntimeError(
+            f"Evaluation failed for {len(failed)} experiment(s): {', '.join(failed)}"
+        )
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Error occurred during evaluation: {e}")
+        traceback.print_exc()
+        exit(1)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+"""
+Throughput and memory benchmark of the evaluation pipeline on synthetic images.
+
+Synthetic render / ground truth image sets are generated for every requested frame count and
+resolution, and each stage of eval_pipeline.py is timed on them on the CPU: loading (decoding both
+folders), normalisation, PSNR scoring with NumPy (the path PSNR-only runs take), and SSIM and
+LPIPS scoring through the CPU backend. Every (stage, frames, resolution, chunk size, workers) case
+runs in its own Python process, so the reported peak RSS belongs to that stage alone (worker
+processes included).
+
+Results are written as JSON, with the machine details next to one record per case holding the
+frames per second and peak RSS of the stage. Keep the file of a known good commit around and
+compare against it to catch regressions, or sweep --chunk_sizes / --workers to pick the settings for
+a machine.
+
+Example:
+    ./benchmark_eval.py results/benchmark.json --frames 64 256 --resolutions 540x960 1080x1920 --chunk_sizes 2 4 8
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import itertools
+import subprocess
+
+import cv2
+import numpy as np
+
+STAGES = ["load", "normalize", "psnr", "ssim", "lpips"]
+# Stages scored through the CPU backend, the only ones the chunk size affects
+BACKEND_STAGES = ["ssim", "lpips"]
+# Runs one case in a child interpreter started in this folder and prints its measurements
+RUN_CASE_COMMAND = (
+    "import sys, json; from benchmark_eval import run_case; "
+    "print(json.dumps(run_case(json.loads(sys.argv[1]))))"
+)
+
+
+def parse_resolution(resolution):
+    """Parse a resolution given as HEIGHTxWIDTH, e.g. 540x960."""
+    height, width = resolution.lower().split("x")
+    return int(height), int(width)
+
+
+def make_synthetic_set(folder, num_frames, height, width, image_format="png", seed=0):
+    """
+    Write num_frames ground truth images and matching noisy "renders" to folder/gt and
+    folder/renders, named like the real frames (frame_00000.png). The ground truth is smooth
+    random texture, the renders add Gaussian noise to it, so every metric has something to measure.
+    """
+    rng = np.random.default_rng(seed)
+    gt_dir = os.path.join(folder, "gt")
+    render_dir = os.path.join(folder, "renders")
+    os.makedirs(gt_dir, exist_ok=True)
+    os.makedirs(render_dir, exist_ok=True)
+    for i in range(num_frames):
+        coarse = rng.integers(0, 256, (max(height // 8, 1), max(width // 8, 1), 3), dtype=np.uint8)
+        gt = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_LINEAR)
+        noise = rng.normal(0, 8, gt.shape)
+        pred = np.clip(gt + noise, 0, 255).astype(np.uint8)
+        filename = f"frame_{i:05d}.{image_format}"
+        cv2.imwrite(os.path.join(gt_dir, filename), gt)
+        cv2.imwrite(os.path.join(render_dir, filename), pred)
+    return gt_dir, render_dir
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its finished children, in MB."""
+    peak_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak_kb / 1024
+
+
+def run_case(case):
+    """
+    Time one stage on one synthetic set. Called in a fresh process by run_case_subprocess.
+    Inputs of the stage (decoded or normalized frames, the LPIPS network) are prepared before the
+    clock starts; rss_before_mb is the peak RSS up to that point.
+    """
+    from frame_loader import decode_images
+    from eval_pipeline import compute_metrics, list_image_files, normalize_images
+
+    pred_paths, _ = list_image_files(case["render_dir"])
+    gt_paths, _ = list_image_files(case["gt_dir"])
+    stage = case["stage"]
+    workers = case["workers"]
+
+    if stage == "load":
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        decode_images(pred_paths, num_workers=workers)
+        decode_images(gt_paths, num_workers=workers)
+        elapsed = time.perf_counter() - start
+    else:
+        pred = decode_images(pred_paths, num_workers=workers)
+        gt = decode_images(gt_paths, num_workers=workers)
+        if stage == "normalize":
+            rss_before = peak_rss_mb()
+            start = time.perf_counter()
+            normalize_images(pred)
+            normalize_images(gt)
+            elapsed = time.perf_counter() - start
+        else:
+            backend = None
+            if stage in BACKEND_STAGES:
+                # Imported here so torch does not count towards the load and normalize stages
+                from eval_backends import CpuBackend
+
+                backend = CpuBackend(
+                    num_workers=workers,
+                    use_processes=case["cpu_executor"] == "process",
+                    lpips_net=case["lpips_net"],
+                )
+            # Warm up on one chunk so network loading and pool start-up are not timed
+            warmup = case["chunk_size"] or 1
+            compute_metrics(pred[:warmup], gt[:warmup], [stage], backend, case["chunk_size"])
+            rss_before = peak_rss_mb()
+            start = time.perf_counter()
+            compute_metrics(pred, gt, [stage], backend, case["chunk_size"])
+            elapsed = time.perf_counter() - start
+            if backend is not None:
+                backend.close()
+
+    return {
+        "seconds": elapsed,
+        "fps": case["frames"] / elapsed if elapsed > 0 else float("inf"),
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_case_subprocess(case):
+    """Run one case in a new interpreter and return its measurements."""
+    result = subprocess.run(
+        [sys.executable, "-c", RUN_CASE_COMMAND, json.dumps(case)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark case {case['stage']} failed:\n{result.stderr}")
+    # The measurements are the last line of stdout, after anything the stage printed
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def build_cases(args, synthetic_sets):
+    """
+    Every combination of stage, image set, chunk size and worker count. The chunk size only
+    affects the backend stages, so load / normalize / psnr cases are run once.
+    """
+    cases = []
+    for stage, (frames, height, width), workers in itertools.product(
+        args.stages, synthetic_sets, args.workers
+    ):
+        gt_dir, render_dir = synthetic_sets[(frames, height, width)]
+        chunk_sizes = args.chunk_sizes if stage in BACKEND_STAGES else [None]
+        for chunk_size in chunk_sizes:
+            cases.append(
+                {
+                    "stage": stage,
+                    "frames": frames,
+                    "height": height,
+                    "width": width,
+                    "chunk_size": chunk_size,
+                    "workers": workers,
+                    "cpu_executor": args.cpu_executor,
+                    "lpips_net": args.lpips_net,
+                    "gt_dir": gt_dir,
+                    "render_dir": render_dir,
+                }
+            )
+    return cases
+
+
+def machine_info():
+    import torch
+
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the throughput and peak memory of the evaluation pipeline stages."
+    )
+    parser.add_argument("output_json", type=str, help="File to write the results to")
+    parser.add_argument(
+        "--frames", type=int, nargs="+", default=[32], help="Frame counts of the synthetic sets"
+    )
+    parser.add_argument(
+        "--resolutions",
+        type=str,
+        nargs="+",
+        default=["540x960"],
+        help="Resolutions of the synthetic sets, as HEIGHTxWIDTH",
+    )
+    parser.add_argument(
+        "--chunk_sizes",
+        type=int,
+        nargs="+",
+        default=[4],
+        help="Chunk sizes of the SSIM / LPIPS stages (0 sizes chunks automatically from free memory)",
+    )
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1], help="Decode and CPU backend worker counts"
+    )
+    parser.add_argument(
+        "--stages", type=str, nargs="+", default=STAGES, choices=STAGES, help="Stages to time"
+    )
+    parser.add_argument("--cpu_executor", type=str, default="thread", choices=["thread", "process"])
+    parser.add_argument("--lpips_net", type=str, default="alex", choices=["alex", "vgg", "squeeze"])
+    parser.add_argument(
+        "--image_format",
+        type=str,
+        default="png",
+        choices=["png", "jpg"],
+        help="Synthetic image format",
+    )
+    parser.add_argument(
+        "--work_dir",
+        type=str,
+        default=None,
+        help="Folder for the synthetic images, kept after the run (default: a temporary folder)",
+    )
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="eval_benchmark_")
+    args.chunk_sizes = [chunk_size or None for chunk_size in args.chunk_sizes]
+    try:
+        synthetic_sets = {}
+        for frames, resolution in itertools.product(args.frames, args.resolutions):
+            height, width = parse_resolution(resolution)
+            folder = os.path.join(work_dir, f"{frames}_{height}x{width}_{args.image_format}")
+            print(f"Generating {frames} synthetic frame pairs at {height}x{width}...")
+            synthetic_sets[(frames, height, width)] = make_synthetic_set(
+                folder, frames, height, width, args.image_format
+            )
+
+        results = []
+        for case in build_cases(args, synthetic_sets):
+            measurements = run_case_subprocess(case)
+            record = {key: value for key, value in case.items() if not key.endswith("_dir")}
+            record.update(measurements)
+            results.append(record)
+            print(
+                f"{case['stage']:>9s}  {case['frames']:5d} x {case['height']}x{case['width']}"
+                f"  chunk {str(case['chunk_size'] or '-'):>4s}  workers {case['workers']:2d}"
+                f"  {record['fps']:9.2f} fps  peak RSS {record['peak_rss_mb']:8.1f} MB"
+            )
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output_dir = os.path.dirname(args.output_json)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output_json, "w") as f:
+        json.dump(
+            {"machine": machine_info(), "created": time.time(), "results": results}, f, indent=4
+        )
+    print(f"Saved benchmark results to {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,9 @@ import os
 import numpy as np
 import argparse
 
-from utils import get_config
-from retrieve_frames import get_frames_data
+from utils import get_config, find_dataparser_transforms_file
+from transforms_index import TransformsIndex
+from serialization import add_serialization_arguments, dump_json, load_poses, save_poses
 
 
 def invert_transformation(matrix):
@@ -24,15 +25,18 @@ def invert_transformation(matrix):
     return matrix_inv
 
 
-def create_camera_path(org_json_path, selected_frame_numbers, w_to_rf_path, output_json_path):
-    """
-    Create a camera path json file based on the data extracted from the original transforms.json file.
-    """
+def invert_transformations(matrices):
+    """Invert an (..., 4, 4) stack of rigid transformation matrices in closed form."""
+    R_inv = np.swapaxes(matrices[..., :3, :3], -1, -2)
+    matrices_inv = np.zeros(np.shape(matrices))
+    matrices_inv[..., :3, :3] = R_inv
+    matrices_inv[..., :3, 3] = -(R_inv @ matrices[..., :3, 3:])[..., 0]
+    matrices_inv[..., 3, 3] = 1.0
+    return matrices_inv
 
-    # Extract the frames that match the selected frame numbers, along with all other data
-    data = get_frames_data(org_json_path, selected_frame_numbers)
 
-    # Get transforms data from the world to the radiance field coordinates
+def load_dataparser_transform(w_to_rf_path):
+    """Read the world to radiance field transform (as a 4x4 matrix) and scale of a dataparser_transforms.json."""
     with open(w_to_rf_path, "r") as f:
         w_to_rf_data = json.load(f)
 
@@ -42,9 +46,42 @@ def create_camera_path(org_json_path, selected_frame_numbers, w_to_rf_path, outp
     T_w_rf = np.array(w_to_rf_data["transform"])
     assert T_w_rf.shape == (3, 4), "Transformation data is not 3x4"
     T_w_rf = np.vstack((T_w_rf, np.array([0, 0, 0, 1])))
+    return T_w_rf, w_to_rf_data["scale"]
+
 
+def colmap_to_rf(poses, T_w_rf, scale):
+    """
+    Map an (N, 4, 4) stack of camera poses from the transforms file to radiance field coordinates for
+    one or more dataparser transforms: T_w_rf is (4, 4) or (E, 4, 4) with scale a float or (E,) array.
+    Returns (N, 4, 4) or (E, N, 4, 4) poses.
+    """
+    # Swap the y and z rows and negate the new y row
+    T_w_c = poses[:, [0, 2, 1, 3]]
+    T_w_c[:, 1] *= -1
+    T_w_rf = np.asarray(T_w_rf)
+    scale = np.asarray(scale, dtype=np.float64)
+    T_c_rf = T_w_rf[..., None, :, :] @ T_w_c
+    T_c_rf[..., :3, 3] *= scale[..., None, None]
+    return T_c_rf
+
+
+def rf_to_colmap(T_c_rf, T_w_rf, scale):
+    """
+    Inverse of colmap_to_rf: map an (N, 4, 4) stack of radiance field camera poses back to the
+    coordinates of the transforms file, undoing the scale, the dataparser transform and the axis swap.
+    """
+    T_c_rf = np.array(T_c_rf, dtype=np.float64)
+    T_c_rf[..., :3, 3] /= scale
+    T_w_c = invert_transformations(np.asarray(T_w_rf, dtype=np.float64)) @ T_c_rf
+    # Undo the negation of the y row, then swap the y and z rows back
+    T_w_c[..., 1, :] *= -1
+    return T_w_c[..., [0, 2, 1, 3], :]
+
+
+def camera_path_header(data):
+    """Camera path attributes shared by every frame, from the header of the transforms file."""
     # Assert that required keys exist in data
-    required_keys = ["w", "h", "fl_y", "frames"]
+    required_keys = ["w", "h", "fl_y"]
     for key in required_keys:
         if key not in data:
             raise KeyError(f"Key '{key}' is missing from frames transform data")
@@ -63,52 +100,139 @@ def create_camera_path(org_json_path, selected_frame_numbers, w_to_rf_path, outp
         2 * np.arctan(camera_path["render_height"] / (2 * data["fl_y"])) * 180 / np.pi
     )
     camera_path["default_transition_sec"] = 2.0
+    return camera_path
+
+
+def write_camera_path(header, T_c_rf, frame_nums, output_json_path, compact=False, precision=None):
+    """
+    Write a camera path with the given header and (N, 4, 4) radiance field poses to json, compact
+    and with floats rounded to precision significant digits if requested.
+    """
+    camera_path = dict(header)
     # Aspect ratio (use for computing frames)
     aspect = camera_path["render_width"] / camera_path["render_height"]
-
-    # Now, create the transfroms for each frame
-    camera_path["camera_path"] = []
-    for frame in data["frames"]:
-        frame_info = dict()
-        T_w_c = np.array(frame["transform_matrix"])
-        T_w_c[1], T_w_c[2] = T_w_c[2].copy(), T_w_c[1].copy()
-        T_w_c[1] = [-x for x in T_w_c[1]]
-        T_c_rf = T_w_rf @ T_w_c
-        T_c_rf[:3, 3] *= w_to_rf_data["scale"]
-        # print(T_c_rf)
-        frame_info["camera_to_world"] = T_c_rf.flatten().tolist()
-        frame_info["fov"] = camera_path["default_fov"]
-        frame_info["aspect"] = aspect
-        frame_info["frame_num"] = int(
-            frame["file_path"].split("/")[-1].split(".")[0].split("_")[-1]
+    camera_path["camera_path"] = [
+        {
+            "camera_to_world": matrix,
+            "fov": camera_path["default_fov"],
+            "aspect": aspect,
+            "frame_num": frame_num,
+        }
+        for matrix, frame_num in zip(
+            np.asarray(T_c_rf).reshape(len(T_c_rf), 16).tolist(), np.asarray(frame_nums).tolist()
         )
-        camera_path["camera_path"].append(frame_info)
+    ]
 
     # Ensure the output folder exists
     assert os.path.exists(os.path.dirname(output_json_path)), (
         f"Output folder '{os.path.dirname(output_json_path)}' d.n.e., plz create it."
     )
-    # # Warning overwriting existing files
-    # if os.path.exists(output_json_path):
-    #     print(f"Warning: {output_json_path} already exists. Overwriting it.")
 
     # Write the new data to the output_json_path
-    with open(output_json_path, "w") as f:
-        json.dump(camera_path, f, indent=4)
+    dump_json(camera_path, output_json_path, compact, precision)
+
+
+def poses_path(output_json_path):
+    """Path of the binary poses written next to a camera path json."""
+    return os.path.splitext(output_json_path)[0] + ".poses"
+
+
+def export_camera_path(poses_file, output_json_path, compact=False, precision=None):
+    """Write the nerfstudio camera path json of a binary poses file written by create_camera_paths."""
+    T_c_rf, frame_nums, header = load_poses(poses_file)
+    write_camera_path(header, T_c_rf, frame_nums, output_json_path, compact, precision)
+
+
+def create_camera_paths(
+    org_json_path, selected_frame_numbers, jobs, compact=False, precision=None, binary=False
+):
+    """
+    Create the camera paths of many experiments over the same frames. jobs is a list of
+    (dataparser_transforms.json path, output json path) pairs. The selected poses are read from the
+    transforms index once and mapped for every experiment in one batched matrix product. With
+    binary=True the poses are also written to a binary .poses file next to each json.
+    """
+    index = TransformsIndex.open(org_json_path)
+    rows = index.rows(selected_frame_numbers)
+    header = camera_path_header(index.header)
+
+    transforms = [load_dataparser_transform(w_to_rf_path) for w_to_rf_path, _ in jobs]
+    T_w_rf = np.stack([T for T, _ in transforms])
+    scales = np.array([scale for _, scale in transforms], dtype=np.float64)
+    T_c_rf = colmap_to_rf(index.poses[rows], T_w_rf, scales)
+
+    for (_, output_json_path), poses in zip(jobs, T_c_rf):
+        write_camera_path(
+            header, poses, index.frame_nums[rows], output_json_path, compact, precision
+        )
+        if binary:
+            save_poses(poses_path(output_json_path), poses, index.frame_nums[rows], header)
+
+
+def create_camera_path(org_json_path, selected_frame_numbers, w_to_rf_path, output_json_path):
+    """
+    Create a camera path json file based on the data extracted from the original transforms.json file.
+    """
+    create_camera_paths(org_json_path, selected_frame_numbers, [(w_to_rf_path, output_json_path)])
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Find the dataparser transforms file.")
-    parser.add_argument("dataparser_path", type=str, help="Path to dataparser transforms file.")
-    parser.add_argument("output_path", type=str, help="Output path.")
+    parser = argparse.ArgumentParser(
+        description="Create the eval camera paths of one or more experiments."
+    )
+    parser.add_argument(
+        "paths",
+        type=str,
+        nargs="*",
+        help="Pairs of dataparser transforms file and output path: dataparser_path output_path [...]",
+    )
+    parser.add_argument(
+        "--experiments",
+        type=str,
+        nargs="+",
+        default=[],
+        help="Experiments to create camera paths for. Their dataparser transforms file is found in the "
+        "models folder and the path is written to <camera_path>/<experiment>_camera_path.json",
+    )
+    add_serialization_arguments(parser)
+    parser.add_argument(
+        "--export",
+        type=str,
+        nargs=2,
+        metavar=("POSES_FILE", "OUTPUT_JSON"),
+        default=None,
+        help="Only convert a binary .poses file back to a nerfstudio camera path json",
+    )
     args = parser.parse_args()
 
+    if args.export:
+        export_camera_path(*args.export, compact=args.compact, precision=args.precision)
+        exit(0)
+
     config = get_config()
     selected_frame_numbers = [i for i in range(741, 973)]
     org_json_path = os.path.join(config["proj_dir"], config["full_transforms"])
-    output_json_path = args.output_path
-    # This file (dataparser_transforms.json in model folder) converts colmap coordinates to NeRF coordinates
-    w_to_rf_path = args.dataparser_path
 
-    # Create the camera path and write it to json
-    create_camera_path(org_json_path, selected_frame_numbers, w_to_rf_path, output_json_path)
+    # Each dataparser_transforms.json (in model folder) converts colmap coordinates to NeRF coordinates
+    if len(args.paths) % 2 != 0:
+        parser.error("paths must be pairs of dataparser transforms file and output path")
+    jobs = list(zip(args.paths[::2], args.paths[1::2]))
+    for exp_name in args.experiments:
+        dataparser_path = find_dataparser_transforms_file(
+            os.path.join(config["proj_dir"], config["models"], exp_name)
+        )
+        if not dataparser_path:
+            raise FileNotFoundError(
+                f"No dataparser_transforms.json found for experiment {exp_name}"
+            )
+        output_json_path = os.path.join(
+            config["proj_dir"], config["camera_path"], f"{exp_name}_camera_path.json"
+        )
+        jobs.append((dataparser_path, output_json_path))
+    if not jobs:
+        parser.error("give dataparser_path output_path pairs or --experiments")
+
+    # Create the camera paths and write them to json
+    create_camera_paths(
+        org_json_path, selected_frame_numbers, jobs, args.compact, args.precision, args.binary
+    )
@@ -0,0 +1,162 @@
+"""
+Background writer for the side-by-side (render | ground truth) comparison images of eval_pipeline.py.
+
+Comparisons are handed to a pool of threads that convert and encode them while the caller goes on
+scoring the next chunk (OpenCV releases the GIL while encoding). They can be written as one PNG per
+frame, as a single video, or only for the N worst frames by a metric, which are kept in memory until
+the writer is closed.
+"""
+
+import os
+import heapq
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# Metrics the worst frames can be picked by, and whether higher scores are worse
+WORST_METRICS = {"psnr": False, "ssim": False, "lpips": True}
+VIDEO_FILENAME = "comparisons.mp4"
+# Frames encoded per writer task, and tasks that may be queued per writer thread before write()
+# blocks
+FRAMES_PER_TASK = 8
+MAX_PENDING_PER_WORKER = 4
+
+
+def default_writer_workers():
+    return min(4, os.cpu_count() or 1)
+
+
+def to_bgr_uint8(comparison):
+    """Convert an RGB(A) comparison image, uint8 or normalized to [0, 1], to a BGR uint8 image."""
+    # Convert to uint8 if normalized
+    if comparison.dtype != np.uint8:
+        comparison = (comparison * 255).astype(np.uint8)
+    return cv2.cvtColor(comparison[..., :3], cv2.COLOR_RGB2BGR)
+
+
+class ComparisonWriter:
+    """
+    Write side-by-side comparison images to output_folder in the background.
+
+    mode is "png" (one comparison_<frame>.png per frame, encoded at compression level 0-9) or
+    "video" (all frames in order, in output_folder/comparisons.mp4). With worst set, only the
+    comparisons of the worst frames by worst_metric are written, worst first, when the writer is
+    closed.
+    Use as a context manager, or call close() to wait for all writes to finish.
+    """
+
+    def __init__(
+        self,
+        output_folder,
+        mode="png",
+        compression=3,
+        num_workers=None,
+        worst=None,
+        worst_metric="psnr",
+        fps=30,
+    ):
+        if mode not in ("png", "video"):
+            raise ValueError(f"Unknown comparison mode {mode}, use png or video")
+        if worst is not None and worst_metric not in WORST_METRICS:
+            raise ValueError(f"Cannot pick worst frames by {worst_metric}")
+        os.makedirs(output_folder, exist_ok=True)
+        self.output_folder = output_folder
+        self.mode = mode
+        self.compression = compression
+        self.worst = worst
+        self.worst_metric = worst_metric
+        self.fps = fps
+        # Video frames must be encoded in order, so the video is written by a single thread
+        num_workers = 1 if mode == "video" else num_workers or default_writer_workers()
+        self.executor = ThreadPoolExecutor(max_workers=num_workers)
+        self.max_pending = MAX_PENDING_PER_WORKER * num_workers
+        self.pending = deque()
+        self.video = None
+        self.num_written = 0
+        # Min-heap of (badness, tie breaker, frame number, comparison) holding the worst frames
+        self.worst_heap = []
+        self.counter = itertools.count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def filename(self, frame_num):
+        return os.path.join(self.output_folder, f"comparison_{frame_num:04d}.png")
+
+    def write(self, pred_images, eval_images, frame_nums, scores=None):
+        """
+        Queue the comparisons of a chunk of frames. The images are copied, so the caller may reuse
+        its buffers right away. scores (one worst_metric score per frame) is needed to pick the worst
+        frames.
+        """
+        frame_nums = list(frame_nums)
+        if self.worst is not None:
+            if scores is None:
+                raise ValueError("Picking the worst frames needs their scores")
+            sign = 1 if WORST_METRICS[self.worst_metric] else -1
+            for i, (frame_num, score) in enumerate(zip(frame_nums, scores)):
+                if np.isnan(score):
+                    continue
+                item = (sign * score, next(self.counter), frame_num, None)
+                if len(self.worst_heap) == self.worst and item <= self.worst_heap[0]:
+                    continue
+                # Only frames that make it into the heap are copied
+                item = item[:3] + (np.concatenate([pred_images[i], eval_images[i]], axis=1),)
+                if len(self.worst_heap) < self.worst:
+                    heapq.heappush(self.worst_heap, item)
+                else:
+                    heapq.heapreplace(self.worst_heap, item)
+            return
+
+        for start in range(0, len(frame_nums), FRAMES_PER_TASK):
+            stop = start + FRAMES_PER_TASK
+            # Concatenate horizontally: predicted on left, ground truth on right
+            comparisons = np.concatenate([pred_images[start:stop], eval_images[start:stop]], axis=2)
+            self._submit(comparisons, frame_nums[start:stop])
+
+    def _submit(self, comparisons, frame_nums):
+        # Bound the queue, so a slow disk cannot make comparisons pile up in memory
+        while len(self.pending) >= self.max_pending:
+            self.num_written += self.pending.popleft().result()
+        self.pending.append(self.executor.submit(self._encode, comparisons, frame_nums))
+
+    def _encode(self, comparisons, frame_nums):
+        for comparison, frame_num in zip(comparisons, frame_nums):
+            image = to_bgr_uint8(comparison)
+            if self.mode == "video":
+                if self.video is None:
+                    height, width = image.shape[:2]
+                    self.video = cv2.VideoWriter(
+                        os.path.join(self.output_folder, VIDEO_FILENAME),
+                        cv2.VideoWriter_fourcc(*"mp4v"),
+                        self.fps,
+                        (width, height),
+                    )
+                self.video.write(image)
+            else:
+                params = [cv2.IMWRITE_PNG_COMPRESSION, self.compression]
+                if not cv2.imwrite(self.filename(frame_num), image, params):
+                    raise IOError(f"Could not write {self.filename(frame_num)}")
+        return len(comparisons)
+
+    def close(self):
+        """Write the worst frames, if requested, and wait until every comparison is written."""
+        if self.worst is not None and self.worst_heap:
+            worst = sorted(self.worst_heap, key=lambda item: item[:2], reverse=True)
+            self.worst_heap = []
+            for start in range(0, len(worst), FRAMES_PER_TASK):
+                batch = worst[start : start + FRAMES_PER_TASK]
+                self._submit([item[3] for item in batch], [item[2] for item in batch])
+        while self.pending:
+            self.num_written += self.pending.popleft().result()
+        self.executor.shutdown()
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+        print(f"Saved {self.num_written} comparison images to {self.output_folder}")
@@ -0,0 +1,249 @@
+"""
+Execution backends for the SSIM / LPIPS scoring in eval_pipeline.py.
+
+CudaBackend spreads chunks of image pairs over every visible GPU with one LPIPS model per device.
+CpuBackend spreads them over a pool of CPU workers (threads or processes), each limited to a few
+torch threads so the pool as a whole keeps every core busy. get_backend picks CUDA when devices
+exist and falls back to the CPU otherwise.
+
+LPIPS networks are only loaded the first time a chunk needs them, and lpips / pytorch_msssim are
+only imported by the metric that uses them. Loaded networks are kept in a per-process cache keyed
+by (network, device).
+"""
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+import torch
+
+# Rough upper estimate of the peak bytes needed per pixel while scoring one image pair
+# (float inputs on both sides plus the LPIPS activations)
+BYTES_PER_PIXEL = 256
+# Torch threads per CPU worker when the worker count is not given. Intra-op scaling flattens out
+# after a few threads, so several small workers use a many-core box better than one large one
+THREADS_PER_CPU_WORKER = 4
+
+
+# ---- Per-process LPIPS model cache ----
+_MODEL_CACHE = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+
+def get_lpips_model(net, device):
+    """Return the LPIPS model for (net, device), loading it on first use."""
+    key = (net, str(device))
+    with _MODEL_CACHE_LOCK:
+        if key not in _MODEL_CACHE:
+            import lpips
+
+            model = lpips.LPIPS(net=net, verbose=False).to(device)
+            model.eval()
+            _MODEL_CACHE[key] = model
+        return _MODEL_CACHE[key]
+
+
+# Precision SSIM and LPIPS are computed in on each device type (CUDA runs them under fp16 autocast)
+DEVICE_PRECISION = {"cuda": "fp16", "cpu": "fp32"}
+
+
+@torch.no_grad()
+def score_chunk(pred_chunk, gt_chunk, device, metrics, lpips_net="alex"):
+    """
+    Score a chunk of NHWC image pairs with every metric in metrics ("psnr", "ssim", "lpips") on
+    device. The chunk is converted to tensors and moved to the device once for all metrics. Inputs
+    are uint8 or normalized floats. Returns an (n, len(metrics)) float array.
+    """
+    # NHWC→NCHW
+    pred = torch.from_numpy(np.ascontiguousarray(pred_chunk)).to(device, non_blocking=True)
+    gt = torch.from_numpy(np.ascontiguousarray(gt_chunk)).to(device, non_blocking=True)
+    pred = to_unit_range(pred.permute(0, 3, 1, 2))
+    gt = to_unit_range(gt.permute(0, 3, 1, 2))
+
+    scores = []
+    for metric in metrics:
+        if metric == "psnr":
+            # Kept in float32 outside autocast, fp16 squared errors lose too much precision
+            mse = ((pred - gt) ** 2).mean(dim=(1, 2, 3))
+            scores.append(10 * torch.log10(1.0 / mse))
+        elif device.type == "cuda":
+            with torch.autocast("cuda", dtype=torch.float16):
+                scores.append(_score(pred, gt, metric, device, lpips_net))
+        else:
+            scores.append(_score(pred, gt, metric, device, lpips_net))
+
+    scores = torch.stack([score.float() for score in scores], dim=1).cpu().numpy()
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+    return scores
+
+
+def to_unit_range(images):
+    """Convert a uint8 image tensor to float in [0, 1]. Float tensors are assumed normalized."""
+    if images.dtype == torch.uint8:
+        return images.float() / 255.0
+    return images.float()
+
+
+def _score(pred, gt, metric, device, lpips_net):
+    if metric == "lpips":
+        model = get_lpips_model(lpips_net, device)
+        # LPIPS expects inputs in [-1, 1]
+        return model(pred * 2 - 1, gt * 2 - 1).view(-1)
+    if metric == "ssim":
+        from pytorch_msssim import ssim
+
+        return ssim(pred, gt, data_range=1.0, size_average=False).view(-1)
+    raise ValueError(f"Unknown metric: {metric}")
+
+
+def available_memory():
+    """Bytes of physical memory currently available, or None if it cannot be determined."""
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def auto_chunk_size(image_hw, num_frames, num_workers, memory_budget):
+    """
+    Pick a chunk size that splits the frames evenly over the workers while keeping the chunks that
+    run at the same time within memory_budget bytes.
+    """
+    per_pair = BYTES_PER_PIXEL * int(image_hw[0]) * int(image_hw[1])
+    max_by_memory = max(1, memory_budget // (per_pair * num_workers))
+    even_split = max(1, -(-num_frames // num_workers))
+    return int(min(max_by_memory, even_split))
+
+
+class Backend:
+    """Base class: splits image stacks into chunks and scores them on the backend's workers."""
+
+    num_workers = 1
+    lpips_net = "alex"
+
+    def chunk_size_for(self, image_hw, num_frames):
+        raise NotImplementedError
+
+    def submit(self, pred_chunk, gt_chunk, chunk_index, metrics):
+        raise NotImplementedError
+
+    def close(self):
+        self.executor.shutdown()
+
+    def run(self, pred, gt, metrics, chunk_size=None):
+        """
+        Score all pairs in the (N, H, W, C) stacks pred and gt with every metric in metrics in a
+        single pass per chunk. Returns an (N, len(metrics)) array.
+        """
+        metrics = tuple(metrics)
+        if len(pred) == 0:
+            return np.empty((0, len(metrics)), dtype=np.float32)
+        if chunk_size is None:
+            chunk_size = self.chunk_size_for(pred.shape[1:3], len(pred))
+
+        futures = []
+        for chunk_index, i in enumerate(range(0, len(pred), chunk_size)):
+            p = pred[i : i + chunk_size]
+            g = gt[i : i + chunk_size]
+            futures.append(self.submit(p, g, chunk_index, metrics))
+
+        return np.concatenate([f.result() for f in futures])
+
+
+class CudaBackend(Backend):
+    """Round-robin chunks over all CUDA devices, one thread and one LPIPS model per device."""
+
+    name = "cuda"
+
+    def __init__(self, lpips_net="alex"):
+        num_gpus = torch.cuda.device_count()
+        if num_gpus == 0:
+            raise RuntimeError("CUDA backend requested but no CUDA devices are available")
+        self.devices = [torch.device(f"cuda:{i}") for i in range(num_gpus)]
+        self.lpips_net = lpips_net
+        self.num_workers = num_gpus
+        self.executor = ThreadPoolExecutor(max_workers=num_gpus)
+
+    def chunk_size_for(self, image_hw, num_frames):
+        # Each device holds one chunk at a time, so size against the smallest free memory
+        free = min(torch.cuda.mem_get_info(device)[0] for device in self.devices)
+        return auto_chunk_size(image_hw, num_frames, self.num_workers, free // 2 * self.num_workers)
+
+    def submit(self, pred_chunk, gt_chunk, chunk_index, metrics):
+        gpu_id = chunk_index % self.num_workers
+        return self.executor.submit(
+            score_chunk, pred_chunk, gt_chunk, self.devices[gpu_id], metrics, self.lpips_net
+        )
+
+
+def _init_cpu_worker(num_threads):
+    # Process pool initializer: split the cores between the worker processes
+    torch.set_num_threads(num_threads)
+
+
+class CpuBackend(Backend):
+    """
+    Score chunks on a pool of CPU workers. Threads share one LPIPS model and avoid copying chunks;
+    processes each load their own model but sidestep any Python-level contention.
+    """
+
+    name = "cpu"
+
+    def __init__(self, num_workers=None, use_processes=False, lpips_net="alex"):
+        cores = os.cpu_count() or 1
+        if num_workers is None:
+            num_workers = max(1, cores // THREADS_PER_CPU_WORKER)
+        self.num_workers = num_workers
+        self.threads_per_worker = max(1, cores // num_workers)
+        self.use_processes = use_processes
+        self.lpips_net = lpips_net
+
+        if use_processes:
+            # Spawn rather than fork, forking after torch has started its thread pools can deadlock
+            self.executor = ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_cpu_worker,
+                initargs=(self.threads_per_worker,),
+            )
+        else:
+            # torch.set_num_threads is process-wide, so thread workers cannot be limited one by one;
+            # they share torch's intra-op pool, which is left as the caller configured it
+            self.executor = ThreadPoolExecutor(max_workers=num_workers)
+
+    def chunk_size_for(self, image_hw, num_frames):
+        memory = available_memory()
+        budget = memory // 2 if memory is not None else 2 * 1024**3
+        return auto_chunk_size(image_hw, num_frames, self.num_workers, budget)
+
+    def submit(self, pred_chunk, gt_chunk, chunk_index, metrics):
+        # Process workers fill their own model cache the first time they see an LPIPS chunk
+        return self.executor.submit(
+            score_chunk, pred_chunk, gt_chunk, torch.device("cpu"), metrics, self.lpips_net
+        )
+
+
+def resolve_device(device="auto"):
+    """The device type ("cuda" or "cpu") a backend for device would score on."""
+    if device == "auto":
+        return "cuda" if torch.cuda.is_available() and torch.cuda.device_count() > 0 else "cpu"
+    return device
+
+
+def get_backend(device="auto", num_workers=None, cpu_executor="thread", lpips_net="alex"):
+    """
+    Create the evaluation backend. device is "cuda", "cpu" or "auto" (CUDA if any devices exist).
+    num_workers and cpu_executor ("thread" or "process") only apply to the CPU backend. Creating a
+    backend does not load any network; LPIPS models are loaded by the first chunk that needs them.
+    """
+    device = resolve_device(device)
+    if device == "cuda":
+        return CudaBackend(lpips_net=lpips_net)
+    if device == "cpu":
+        return CpuBackend(
+            num_workers=num_workers, use_processes=cpu_executor == "process", lpips_net=lpips_net
+        )
+    raise ValueError(f"Unknown evaluation device: {device}")
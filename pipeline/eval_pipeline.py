@@ -9,37 +9,63 @@ import numpy as np
 import os
 import argparse
 from utils import get_config
+from metric_cache import MetricCache, make_key
 import traceback
 
 # Import metrics for calculations
-from skimage.io import imread, imsave
-import lpips
-from pytorch_msssim import ssim
-import torch
-from concurrent.futures import ThreadPoolExecutor
-
-
-def load_images_from_folder(folder, frame_numbers=None, reverse=False, return_frame_nums=False):
-    images = []
+from frame_loader import FrameLoader, decode_images, downsample, downscale, reduced_decode_scale
+from frame_store import FrameStore
+from results_store import append_run
+from comparison_writer import ComparisonWriter
+
+# Metrics that can be requested with --metrics, in their csv column order
+METRICS = ["psnr", "ssim", "lpips"]
+# Smallest image side each metric can be computed at (SSIM window size, LPIPS network depth)
+MIN_METRIC_SIZE = {"psnr": 1, "ssim": 11, "lpips": 32}
+# Frame numbers of the eval images. For now, we'll hard code the frame numbers
+EVAL_FRAME_NUMBERS = [i for i in range(741, 973)]
+
+
+def list_image_files(folder, frame_numbers=None, reverse=False):
+    """
+    List the image files in a folder along with their frame numbers, without decoding anything.
+    Uses the same filename conventions and ordering as load_images_from_folder.
+    """
+    image_paths = []
     image_nums = []
     for filename in sorted(os.listdir(folder)):
         if filename.endswith(".png") or filename.endswith(".jpg"):
-            img = imread(os.path.join(folder, filename))
-            if img is not None:
-                images.append(img)
-                try:
-                    image_nums.append(int(filename.split("_")[-1].split(".")[0]))
-                except ValueError:
-                    print(f"Warning: Could not parse frame number from filename: {filename}")
-                    image_nums.append(-1)
-    images, image_nums = np.array(images), np.array(image_nums)
+            image_paths.append(os.path.join(folder, filename))
+            try:
+                image_nums.append(int(filename.split("_")[-1].split(".")[0]))
+            except ValueError:
+                print(f"Warning: Could not parse frame number from filename: {filename}")
+                image_nums.append(-1)
+    image_paths, image_nums = np.array(image_paths), np.array(image_nums, dtype=int)
     if frame_numbers is not None:
         indices = np.where(np.isin(image_nums, frame_numbers))[0]
-        images = images[indices]
+        image_paths = image_paths[indices]
         image_nums = image_nums[indices]
     if reverse:
-        images = images[::-1]
+        image_paths = image_paths[::-1]
         image_nums = image_nums[::-1]
+    return image_paths, image_nums
+
+
+def load_images_from_folder(
+    folder,
+    frame_numbers=None,
+    reverse=False,
+    return_frame_nums=False,
+    num_workers=None,
+    scale=1,
+    decode_scale=1,
+):
+    # Filter by frame number before decoding, so frames that are not needed are never read
+    image_paths, image_nums = list_image_files(folder, frame_numbers=frame_numbers, reverse=reverse)
+    # Decoded at 1/decode_scale, then shrunk to 1/scale with the 2x2 box filter
+    images = decode_images(image_paths, num_workers=num_workers, scale=decode_scale)
+    images = downscale(images, scale // decode_scale)
     if return_frame_nums:
         return images, image_nums
     return images
@@ -51,96 +77,452 @@ def normalize_images(images):
     return images
 
 
-def save_comparison_images(pred_images, eval_images, output_folder, frame_nums=None):
-    """Save side-by-side comparison images (predicted | ground truth) for debugging."""
-    os.makedirs(output_folder, exist_ok=True)
-
-    for i in range(len(pred_images)):
-        pred = pred_images[i]
-        gt = eval_images[i]
-
-        # Concatenate horizontally: predicted on left, ground truth on right
-        comparison = np.concatenate([pred, gt], axis=1)
-
-        # Convert to uint8 if normalized
-        if comparison.max() <= 1.0:
-            comparison = (comparison * 255).astype(np.uint8)
-
-        # Use frame number if available, otherwise use index
-        if frame_nums is not None:
-            filename = f"comparison_{frame_nums[i]:04d}.png"
-        else:
-            filename = f"comparison_{i:04d}.png"
-
-        imsave(os.path.join(output_folder, filename), comparison)
-
-    print(f"Saved {len(pred_images)} comparison images to {output_folder}")
-
-
-# ---- Create LPIPS model on each GPU ----
-def create_models():
-    models = {}
-    for i in range(torch.cuda.device_count()):
-        device = torch.device(f"cuda:{i}")
-        model = lpips.LPIPS(net="alex").to(device)
-        model.eval()
-        models[i] = model
-    return models
-
-
-MODELS = create_models()
-
-
-# ---- LPIPS evaluate a chunk on a specific GPU ----
-@torch.no_grad()
-def eval_chunk_on_gpu(pred_chunk, gt_chunk, gpu_id, is_lpips):
-    device = torch.device(f"cuda:{gpu_id}")
-    model = MODELS[gpu_id]
-
-    pred = torch.tensor(pred_chunk).permute(0, 3, 1, 2).float()  # NHWC→NCHW
-    gt = torch.tensor(gt_chunk).permute(0, 3, 1, 2).float()
-
-    if is_lpips:
-        pred = pred * 2 - 1
-        gt = gt * 2 - 1
-
-    pred = pred.to(device, non_blocking=True)
-    gt = gt.to(device, non_blocking=True)
-
-    with torch.cuda.amp.autocast(dtype=torch.float16):  # type: ignore
-        if is_lpips:
-            scores = model(pred, gt).view(-1)
-        else:
-            # Assume metric is ssim then
-            scores = ssim(pred, gt, data_range=1.0, size_average=False).view(-1)
+def to_float_images(images):
+    """Convert integer images to float32 in [0, 1]. Float images are assumed to be normalized."""
+    if np.issubdtype(images.dtype, np.integer):
+        return images.astype(np.float32) / np.float32(np.iinfo(images.dtype).max)
+    return images.astype(np.float32, copy=False)
+
+
+def iter_image_chunks(
+    pred_paths,
+    eval_paths,
+    chunk_size,
+    num_workers=None,
+    eval_store=None,
+    eval_frame_nums=None,
+    scale=1,
+    decode_scale=1,
+):
+    """
+    Yield (start index, predicted chunk, ground truth chunk) for matched image pairs, decoding only
+    chunk_size pairs at a time, so peak memory scales with chunk_size. Chunks are the decoder's
+    uint8 buffers and are only valid until the next chunk is requested. The next chunk is decoded
+    in the background while the caller scores the current one.
+
+    If eval_store (a FrameStore) is given, ground truth chunks are sliced from it by eval_frame_nums
+    instead of being decoded from eval_paths. Frames are decoded at 1/decode_scale resolution (see
+    preview_decode_scale) and shrunk to 1/scale with downscale().
+    """
+    pred_loader = FrameLoader(pred_paths, chunk_size, num_workers, decode_scale)
+    if eval_store is None:
+        gt_chunks = (gt for _, gt in FrameLoader(eval_paths, chunk_size, num_workers, decode_scale))
+    else:
+        gt_chunks = (
+            eval_store.select(eval_frame_nums[start : start + chunk_size])
+            for start in range(0, len(eval_frame_nums), chunk_size)
+        )
+    for (start, pred), gt in zip(pred_loader, gt_chunks):
+        pred = downscale(pred, scale // decode_scale)
+        gt = downscale(gt, scale // decode_scale)
+        if pred.shape[1:] != gt.shape[1:]:
+            raise ValueError(
+                f"Image resolution mismatch: predicted {pred.shape[1:]} vs eval {gt.shape[1:]}. "
+                "Images must have the same dimensions."
+            )
+        yield start, pred, gt
 
-    torch.cuda.empty_cache()
-    return scores.cpu()
 
+def save_comparison_images(pred_images, eval_images, output_folder, frame_nums=None):
+    """Save side-by-side comparison images (predicted | ground truth) for debugging."""
+    # Use frame number if available, otherwise use index
+    if frame_nums is None:
+        frame_nums = range(len(pred_images))
+    with ComparisonWriter(output_folder) as writer:
+        writer.write(pred_images, eval_images, frame_nums)
+
+
+def create_comparison_writer(args):
+    """Background writer for the --save_comparisons images, or None if they are not requested."""
+    if not args.save_comparisons:
+        return None
+    if args.comparison_worst is not None and args.comparison_metric not in args.metrics:
+        raise ValueError(
+            f"--comparison_metric {args.comparison_metric} must be one of the evaluated --metrics"
+        )
+    return ComparisonWriter(
+        args.save_comparisons,
+        mode=args.comparison_format,
+        compression=args.comparison_compression,
+        worst=args.comparison_worst,
+        worst_metric=args.comparison_metric,
+    )
 
-def parallel_eval(pred, gt, chunk_size=2, is_lpips=True):
-    futures = []
-    results = []
 
-    num_gpus = torch.cuda.device_count()
-    executor = ThreadPoolExecutor(max_workers=num_gpus)
+def write_comparisons(writer, pred_images, eval_images, frame_nums, rows, args):
+    """Queue the comparisons of a scored chunk. rows are the chunk's result rows from score_rows."""
+    if writer is None:
+        return
+    column = result_columns(args).index(args.comparison_metric.upper())
+    # In preview mode the first len(pred_images) rows are the frames at the decoded scale
+    writer.write(pred_images, eval_images, frame_nums, rows[: len(pred_images), column])
+
+
+def parallel_eval(pred, gt, backend, metrics, chunk_size=None):
+    """
+    Score image pairs with all the given metrics on the evaluation backend, converting and moving
+    each chunk to the device once. Returns an (N, len(metrics)) array. chunk_size=None lets the
+    backend pick a batch size from the image size and available memory.
+    """
+    return backend.run(pred, gt, metrics, chunk_size=chunk_size)
+
+
+def compute_metrics(pred_images, eval_images, metrics, backend=None, chunk_size=None):
+    """
+    Compute per-frame scores for NHWC image stacks, either uint8 or normalized to [0, 1]. Returns
+    one score array per entry of metrics, in the same order. Without a backend only PSNR can be
+    computed.
+    """
+    if backend is None:
+        assert list(metrics) == ["psnr"], "SSIM and LPIPS need an evaluation backend"
+        # Scale by dtype rather than by the max value, so dark chunks are not left unnormalized
+        pred_images = to_float_images(pred_images)
+        eval_images = to_float_images(eval_images)
+        # Vectorized PSNR calculation
+        mse = np.mean((pred_images - eval_images) ** 2, axis=(1, 2, 3), dtype=np.float64)
+        return [10 * np.log10(1.0 / mse)]
+
+    # Fused PSNR / SSIM / LPIPS calculation on the GPUs or the CPU worker pool. uint8 chunks are
+    # moved to the device as-is and only converted to float there
+    scores = parallel_eval(pred_images, eval_images, backend, metrics, chunk_size)
+    return list(scores.T)
+
+
+def is_preview(args):
+    return args.scale != 1 or args.pyramid_levels > 1
+
+
+def result_columns(args):
+    """Column names of the result rows. Preview rows start with the scale they were scored at."""
+    columns = [metric.upper() for metric in args.metrics]
+    return ["SCALE"] + columns if is_preview(args) else columns
+
+
+def score_rows(pred_images, eval_images, args, backend=None):
+    """
+    Score a chunk of image pairs and return its result rows. Normally that is one row per frame.
+    In preview mode (--scale / --pyramid_levels) the chunk is scored at every pyramid level,
+    starting at the decoded 1/scale resolution and halving it for each further level, giving one
+    row per frame and level. Metrics are NaN at levels too small to compute them.
+    """
+    if not is_preview(args):
+        return np.vstack(
+            compute_metrics(pred_images, eval_images, args.metrics, backend, args.chunk_size)
+        ).T
+
+    rows = []
+    scale = args.scale
+    for level in range(args.pyramid_levels):
+        if level > 0:
+            pred_images, eval_images = downsample(pred_images), downsample(eval_images)
+            scale *= 2
+        size = min(pred_images.shape[1:3])
+        metrics = [metric for metric in args.metrics if size >= MIN_METRIC_SIZE[metric]]
+        scores = dict(
+            zip(
+                metrics,
+                compute_metrics(pred_images, eval_images, metrics, backend, args.chunk_size),
+            )
+        )
+        columns = [scores.get(metric, np.full(len(pred_images), np.nan)) for metric in args.metrics]
+        rows.append(np.column_stack([np.full(len(pred_images), scale)] + columns))
+    return np.concatenate(rows)
+
+
+def create_backend(args, metrics=None):
+    """Create the SSIM/LPIPS backend, or return None if only PSNR is needed."""
+    if metrics is None:
+        metrics = args.metrics
+    if not set(metrics) & {"ssim", "lpips"}:
+        return None
+    # Imported here so --help, argument errors and PSNR-only runs never import torch
+    from eval_backends import get_backend
+
+    backend = get_backend(args.device, args.workers, args.cpu_executor, args.lpips_net)
+    print(f"Evaluating on {type(backend).__name__} with {backend.num_workers} worker(s)")
+    return backend
+
+
+def preview_decode_scale(args, *path_lists):
+    """
+    Scale to decode the frames of path_lists (renders and ground truth) at for --scale. The reduced
+    JPEG decode is only used if all of them are JPEG files and the ground truth is not read from
+    --frame_store, so renders and ground truth are always shrunk with the same filter.
+    """
+    if args.frame_store:
+        return 1
+    return reduced_decode_scale(np.concatenate(path_lists), args.scale)
+
+
+def metric_params(metric, args, decode_scale=1):
+    """Parameters that change a metric's value. They are part of the metric cache key."""
+    if metric == "lpips":
+        params = {"net": args.lpips_net}
+    elif metric == "ssim":
+        params = {"data_range": 1.0, "win_size": 11}
+    else:
+        params = {"data_range": 1.0}
+    if metric in ("ssim", "lpips"):
+        # CUDA scores these under fp16 autocast, so they differ slightly from CPU fp32 scores
+        from eval_backends import DEVICE_PRECISION, resolve_device
+
+        device = resolve_device(args.device)
+        params["device"] = device
+        params["precision"] = DEVICE_PRECISION[device]
+    if args.scale != 1:
+        params["scale"] = args.scale
+        # The ground truth source and the shrinking filter change the scaled frames
+        params["gt_source"] = "frame_store" if args.frame_store else "files"
+        params["resample"] = "jpeg_dct" if decode_scale > 1 else "box"
+    return params
+
+
+def cached_eval(pred_paths, eval_paths, eval_frame_nums, cache, args, eval_store=None, writer=None):
+    """
+    Look up every (render frame, ground truth frame, metric) score in the metric cache and only
+    decode and score the pairs that are missing. Returns one score array per entry of args.metrics.
+    The backend is only created if SSIM or LPIPS scores are missing.
+    """
+    pred_digests = cache.file_digests(pred_paths)
+    eval_digests = cache.file_digests(eval_paths)
+    decode_scale = preview_decode_scale(args, pred_paths, eval_paths)
+    params = {metric: metric_params(metric, args, decode_scale) for metric in args.metrics}
+    keys = {
+        metric: [make_key(p, g, metric, params[metric]) for p, g in zip(pred_digests, eval_digests)]
+        for metric in args.metrics
+    }
+    found = cache.get_many(key for metric in args.metrics for key in keys[metric])
+    scores = {
+        metric: np.array([found.get(key, np.nan) for key in keys[metric]], dtype=np.float64)
+        for metric in args.metrics
+    }
+
+    # Score every pair missing at least one metric, for all metrics missing from any such pair
+    missing = {metric: np.isnan(scores[metric]) for metric in args.metrics}
+    miss_idx = np.where(np.any(list(missing.values()), axis=0))[0]
+    metrics_needed = [metric for metric in args.metrics if missing[metric].any()]
+    print(f"Metric cache: {len(miss_idx)} of {len(pred_paths)} frame pairs need scoring")
+    if len(miss_idx) == 0:
+        return [scores[metric] for metric in args.metrics]
+
+    backend = create_backend(args, metrics_needed)
+    try:
+        entries = []
+        for start, pred_chunk, gt_chunk in iter_image_chunks(
+            pred_paths[miss_idx],
+            eval_paths[miss_idx],
+            args.stream_chunk_size,
+            args.decode_workers,
+            eval_store,
+            eval_frame_nums[miss_idx],
+            args.scale,
+            decode_scale,
+        ):
+            chunk_idx = miss_idx[start : start + len(pred_chunk)]
+            # Only whole-frame metrics are cached, so skip those the scaled frames are too small for
+            size = min(pred_chunk.shape[1:3])
+            chunk_metrics = [m for m in metrics_needed if size >= MIN_METRIC_SIZE[m]]
+            chunk_scores = compute_metrics(
+                pred_chunk, gt_chunk, chunk_metrics, backend, args.chunk_size
+            )
+            for metric, values in zip(chunk_metrics, chunk_scores):
+                scores[metric][chunk_idx] = values
+                entries.extend(
+                    (keys[metric][i], pred_digests[i], eval_digests[i], metric, value)
+                    for i, value in zip(chunk_idx, values)
+                )
+            # Cached frames are never decoded, so only scored frames get a comparison image
+            rows = np.column_stack([scores[metric][chunk_idx] for metric in args.metrics])
+            if is_preview(args):
+                rows = np.column_stack([np.full(len(chunk_idx), args.scale), rows])
+            write_comparisons(writer, pred_chunk, gt_chunk, eval_frame_nums[chunk_idx], rows, args)
+        cache.put_many(entries)
+    finally:
+        if backend is not None:
+            backend.close()
+    return [scores[metric] for metric in args.metrics]
+
+
+def stream_eval(
+    pred_paths,
+    eval_paths,
+    eval_frame_nums,
+    output_csv,
+    backend,
+    args,
+    eval_store=None,
+    writer=None,
+):
+    """
+    Evaluate matched (render, ground truth) pairs a chunk at a time and append each chunk's rows to
+    the output csv as soon as they are computed. Peak memory depends on the chunk size, not on the
+    number of frames. Returns all rows as one array.
+    """
+    rows = []
+    with open(output_csv, "w") as f:
+        f.write(",".join(result_columns(args)) + "\n")
+        for start, pred_chunk, gt_chunk in iter_image_chunks(
+            pred_paths,
+            eval_paths,
+            args.stream_chunk_size,
+            args.decode_workers,
+            eval_store,
+            eval_frame_nums,
+            args.scale,
+            preview_decode_scale(args, pred_paths, eval_paths),
+        ):
+            print(f"Evaluating frames {start} to {start + len(pred_chunk) - 1}...")
+            data = score_rows(pred_chunk, gt_chunk, args, backend)
+            # Written in the background while the next chunk is decoded and scored
+            write_comparisons(
+                writer,
+                pred_chunk,
+                gt_chunk,
+                eval_frame_nums[start : start + len(pred_chunk)],
+                data,
+                args,
+            )
+            np.savetxt(f, data, delimiter=",", fmt="%.2f")
+            f.flush()
+            rows.append(data)
+    return np.concatenate(rows) if rows else np.empty((0, len(result_columns(args))))
+
+
+def load_eval_images(eval_images_path, args, decode_scale=1):
+    """
+    Eval images and their frame numbers. With --frame_store they are zero-copy slices of the
+    folder's memory-mapped frame store, otherwise they are decoded from the image files at
+    1/decode_scale resolution. Either way they are returned at 1/args.scale resolution.
+    """
+    if args.frame_store:
+        store = FrameStore.open(eval_images_path, num_workers=args.decode_workers)
+        eval_frame_nums = store.frame_nums[np.isin(store.frame_nums, EVAL_FRAME_NUMBERS)]
+        return downscale(store.select(eval_frame_nums), args.scale), eval_frame_nums
+    return load_images_from_folder(
+        eval_images_path,
+        frame_numbers=EVAL_FRAME_NUMBERS,
+        return_frame_nums=True,
+        num_workers=args.decode_workers,
+        scale=args.scale,
+        decode_scale=decode_scale,
+    )
 
-    i = 0
-    gpu_id = 0
 
-    while i < len(pred):
-        p = pred[i : i + chunk_size]
-        g = gt[i : i + chunk_size]
+def save_results(output_csv, data, columns):
+    """Write an array of result rows with the given column names to csv."""
+    np.savetxt(
+        output_csv,
+        data,
+        delimiter=",",
+        fmt="%.2f",
+        header=",".join(columns),
+        comments="",
+    )
 
-        futures.append(executor.submit(eval_chunk_on_gpu, p, g, gpu_id, is_lpips))
 
-        gpu_id = (gpu_id + 1) % num_gpus
-        i += chunk_size
+def add_eval_arguments(parser):
+    """Add the options shared by eval_pipeline.py and batch_eval.py to an argument parser."""
+    parser.add_argument(
+        "--stream_chunk_size",
+        type=int,
+        default=16,
+        help="Number of image pairs decoded at a time in streaming, cached and batch evaluation",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        nargs="+",
+        default=METRICS,
+        choices=METRICS,
+        help="Metrics to compute. Torch and the LPIPS networks are only loaded when needed",
+    )
+    parser.add_argument(
+        "--lpips_net",
+        type=str,
+        default="alex",
+        choices=["alex", "vgg", "squeeze"],
+        help="Backbone network for LPIPS",
+    )
+    parser.add_argument(
+        "--decode_workers",
+        type=int,
+        default=None,
+        help="Number of threads decoding image files (default: min(8, number of cores))",
+    )
+    parser.add_argument(
+        "--results_store",
+        type=str,
+        default=None,
+        help="Also append full-precision per-frame results with frame numbers to this store folder",
+    )
+    parser.add_argument(
+        "--scene", type=str, default=None, help="Scene name recorded in the results store"
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=1,
+        choices=[1, 2, 4, 8],
+        help="Preview mode: decode and score frames at 1/scale resolution",
+    )
+    parser.add_argument(
+        "--pyramid_levels",
+        type=int,
+        default=1,
+        help="Preview mode: also score this many successively halved pyramid levels of each frame",
+    )
+    parser.add_argument(
+        "--frame_store",
+        action="store_true",
+        help="Read eval images from a memory-mapped store of decoded frames, built on first use",
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=None,
+        help="Number of image pairs per SSIM/LPIPS batch (default: picked by the backend)",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="auto",
+        choices=["auto", "cuda", "cpu"],
+        help="Where to run SSIM/LPIPS. auto uses CUDA when devices exist, otherwise the CPU",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of CPU workers (CPU backend only)"
+    )
+    parser.add_argument(
+        "--cpu_executor",
+        type=str,
+        default="thread",
+        choices=["thread", "process"],
+        help="Run CPU workers as threads or processes (CPU backend only)",
+    )
 
-    for f in futures:
-        results.append(f.result())
 
-    return torch.cat(results)
+def save_to_results_store(args, experiment_name, frame_nums, data):
+    """
+    Append per-frame scores at full precision to the --results_store, if one was given. Preview
+    results are stored as one run per scale, with the scale recorded in the run metadata.
+    """
+    if args.results_store is None:
+        return
+    if not is_preview(args):
+        levels = [(None, data)]
+    else:
+        levels = [(scale, data[data[:, 0] == scale, 1:]) for scale in np.unique(data[:, 0])]
+    for scale, level_data in levels:
+        scores = dict(zip(args.metrics, level_data.T))
+        run_id = append_run(
+            args.results_store,
+            frame_nums,
+            scores,
+            experiment_name,
+            scene=args.scene,
+            scale=None if scale is None else int(scale),
+        )
+        print(f"Appended run {run_id} ({experiment_name}) to results store {args.results_store}")
 
 
 def main():
@@ -155,24 +537,141 @@ def main():
         default=None,
         help="Path to save side-by-side comparison images for debugging",
     )
+    parser.add_argument(
+        "--comparison_format",
+        type=str,
+        default="png",
+        choices=["png", "video"],
+        help="Write comparisons as one PNG per frame or as a single comparisons.mp4 video",
+    )
+    parser.add_argument(
+        "--comparison_compression",
+        type=int,
+        default=3,
+        choices=range(10),
+        help="PNG compression level of the comparison images (0 = fastest, 9 = smallest)",
+    )
+    parser.add_argument(
+        "--comparison_worst",
+        type=int,
+        default=None,
+        help="Only save the comparisons of this many worst frames by --comparison_metric",
+    )
+    parser.add_argument(
+        "--comparison_metric",
+        type=str,
+        default="psnr",
+        choices=["psnr", "ssim", "lpips"],
+        help="Metric the worst frames are picked by",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Decode and evaluate image pairs in fixed-size chunks instead of loading all frames",
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="Path to a metric cache file. Only frame pairs / metrics not in the cache are scored",
+    )
+    parser.add_argument(
+        "--cache_max_mb", type=float, default=256, help="Size limit of the metric cache in MB"
+    )
+    parser.add_argument(
+        "--clear_cache",
+        action="store_true",
+        help="Invalidate the cached scores of the requested metrics before evaluating",
+    )
+    add_eval_arguments(parser)
     args = parser.parse_args()
 
     # Load config.yaml variables
     config = get_config()
 
-    # Get the keyframe numbers for the experiment. For now, we'll hard code the frame numbers
-    selected_frame_numbers = [i for i in range(741, 973)]
+    eval_images_path = os.path.join(config["proj_dir"], config["eval_images"])
+    # Create directory for output_csv if it does not exist
+    os.makedirs(os.path.dirname(args.output_csv), exist_ok=True)
+
+    if args.stream or args.cache:
+        # Match files up front and only decode them chunk by chunk
+        pred_paths, pred_frame_nums = list_image_files(args.model_renders, reverse=True)
+        eval_paths, eval_frame_nums = list_image_files(
+            eval_images_path, frame_numbers=EVAL_FRAME_NUMBERS
+        )
+        print(f"Render path: {args.model_renders}")
+        print(f"Eval images path: {eval_images_path}")
+        if len(pred_paths) != len(eval_paths):
+            raise ValueError(
+                f"Image count mismatch: {len(pred_paths)} predicted images vs {len(eval_paths)} eval images. "
+                "Ensure the render and eval folders contain the same number of frames."
+            )
+        if not np.array_equal(pred_frame_nums, eval_frame_nums):
+            print("Warning: Frame numbers do not match after alignment!")
+
+        eval_store = None
+        if args.frame_store:
+            eval_store = FrameStore.open(eval_images_path, num_workers=args.decode_workers)
+
+        cache = writer = backend = None
+        try:
+            if args.cache:
+                if args.pyramid_levels > 1:
+                    raise ValueError("--pyramid_levels cannot be combined with --cache")
+                cache = MetricCache(args.cache, max_bytes=int(args.cache_max_mb * 1024**2))
+                if args.clear_cache:
+                    for metric in args.metrics:
+                        cache.invalidate(metric=metric)
+                writer = create_comparison_writer(args)
+                scores = cached_eval(
+                    pred_paths, eval_paths, eval_frame_nums, cache, args, eval_store, writer
+                )
+                if is_preview(args):
+                    scores.insert(0, np.full(len(pred_paths), args.scale))
+                data = np.vstack(scores).T
+                save_results(args.output_csv, data, result_columns(args))
+            else:
+                backend = create_backend(args)
+                writer = create_comparison_writer(args)
+                data = stream_eval(
+                    pred_paths,
+                    eval_paths,
+                    eval_frame_nums,
+                    args.output_csv,
+                    backend,
+                    args,
+                    eval_store,
+                    writer,
+                )
+        finally:
+            if writer is not None:
+                writer.close()
+            if cache is not None:
+                cache.close()
+            if backend is not None:
+                backend.close()
+        print(f"Saved evaluation results to {args.output_csv}")
+        save_to_results_store(args, args.experiment_name, eval_frame_nums, data)
+        return
 
     # Load images
     print("Loading images...")
+    decode_scale = preview_decode_scale(
+        args,
+        list_image_files(args.model_renders)[0],
+        list_image_files(eval_images_path, frame_numbers=EVAL_FRAME_NUMBERS)[0],
+    )
     # Reversing the predicted images to match eval images order
     pred_images, pred_frame_nums = load_images_from_folder(
-        args.model_renders, frame_numbers=None, reverse=True, return_frame_nums=True
-    )
-    eval_images_path = os.path.join(config["proj_dir"], config["eval_images"])
-    eval_images, eval_frame_nums = load_images_from_folder(
-        eval_images_path, frame_numbers=selected_frame_numbers, return_frame_nums=True
+        args.model_renders,
+        frame_numbers=None,
+        reverse=True,
+        return_frame_nums=True,
+        num_workers=args.decode_workers,
+        scale=args.scale,
+        decode_scale=decode_scale,
     )
+    eval_images, eval_frame_nums = load_eval_images(eval_images_path, args, decode_scale)
     print(f"Render path: {args.model_renders}")
     print(f"Eval images path: {eval_images_path}")
     print(f"Predicted images shape: {pred_images.shape}")
@@ -213,10 +712,9 @@ def main():
         "Ground truth image is not normalized to [0, 1]"
     )
 
-    # Save comparison images for debugging if requested
-    if args.save_comparisons:
-        print("Saving comparison images...")
-        save_comparison_images(pred_images, eval_images, args.save_comparisons, eval_frame_nums)
+    # Save comparison images for debugging if requested. They are queued chunk by chunk while the
+    # metrics are computed, so they are written in the background while the next chunk is scored
+    writer = create_comparison_writer(args)
 
     # # View 100th image for sanity check
     # import matplotlib.pyplot as plt
@@ -241,29 +739,38 @@ def main():
 
     # plt.show()
 
-    print("Calculating PSNR scores...")
-    # Vectorized PSNR calculation
-    mse = np.mean((pred_images - eval_images) ** 2, axis=(1, 2, 3))
-    psnr_scores = 10 * np.log10(1.0 / mse)
-
-    print("Calculating SSIM scores...")
-    # GPU accelerated SSIM calculation
-    ssim_scores = parallel_eval(pred_images, eval_images, chunk_size=4, is_lpips=False)
-    ssim_scores = ssim_scores.cpu().numpy()
-
-    print("Calculating LPIPS scores...")
-    lpips_scores_tensor = parallel_eval(pred_images, eval_images, chunk_size=4, is_lpips=True)
-    lpips_scores = lpips_scores_tensor.cpu().numpy()
-
-    data = np.vstack((psnr_scores, ssim_scores, lpips_scores)).T
-
-    # Create directory for output_csv if it does not exist
-    os.makedirs(os.path.dirname(args.output_csv), exist_ok=True)
-    np.savetxt(
-        args.output_csv, data, delimiter=",", fmt="%.2f", header="PSNR,SSIM,LPIPS", comments=""
-    )
+    print(f"Calculating {', '.join(metric.upper() for metric in args.metrics)} scores...")
+    backend = create_backend(args)
+    try:
+        # Without comparisons all frames are scored at once
+        chunk_size = args.stream_chunk_size if writer is not None else max(1, len(pred_images))
+        rows = []
+        for start in range(0, len(pred_images), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            chunk_rows = score_rows(pred_images[chunk], eval_images[chunk], args, backend)
+            write_comparisons(
+                writer,
+                pred_images[chunk],
+                eval_images[chunk],
+                eval_frame_nums[chunk],
+                chunk_rows,
+                args,
+            )
+            rows.append(chunk_rows)
+        data = np.concatenate(rows) if rows else np.empty((0, len(result_columns(args))))
+        if is_preview(args):
+            # Keep the rows of each pyramid level together, like scoring all frames at once
+            data = data[np.argsort(data[:, 0], kind="stable")]
+    finally:
+        if writer is not None:
+            writer.close()
+        if backend is not None:
+            backend.close()
+
+    save_results(args.output_csv, data, result_columns(args))
 
     print(f"Saved evaluation results to {args.output_csv}")
+    save_to_results_store(args, args.experiment_name, eval_frame_nums, data)
 
 
 if __name__ == "__main__":
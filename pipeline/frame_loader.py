@@ -0,0 +1,178 @@
+"""
+Parallel image decoding for the evaluation pipeline.
+
+Image decoding releases the GIL, so a pool of threads decodes several PNG/JPEG files at once. Frames
+are written straight into preallocated uint8 buffers, and FrameLoader decodes the next batch in the
+background while the caller is still working on the current one.
+
+Frames can also be decoded at 1/2, 1/4 or 1/8 resolution for quick previews. JPEG files are then
+decoded directly at the reduced scale (libjpeg scales in the DCT domain, so most of the full-size
+decode is skipped). That is a different filter than the 2x2 box of downscale(), so frames that are
+compared to each other must all be shrunk the same way, see reduced_decode_scale().
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from skimage.io import imread
+
+# Supported reduced decode scales and the matching OpenCV flags
+REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+
+
+def default_decode_workers():
+    return min(8, os.cpu_count() or 1)
+
+
+def to_rgb(img):
+    """Drop the alpha channel of an RGBA image and expand a grayscale image to 3 channels."""
+    if img.ndim == 2:
+        return np.repeat(img[..., None], 3, axis=2)
+    if img.shape[2] == 1:
+        return np.repeat(img, 3, axis=2)
+    return img[..., :3]
+
+
+def decode_image(path, scale=1):
+    """
+    Decode an image as an RGB array, at 1/scale of its resolution. Alpha is dropped and grayscale
+    expanded at every scale, so the channel layout does not depend on the scale.
+    """
+    if scale == 1:
+        return to_rgb(imread(path))
+    if scale not in REDUCED_DECODE_FLAGS:
+        raise ValueError(f"Unsupported decode scale {scale}, use one of 1, 2, 4, 8")
+    img = cv2.imread(path, REDUCED_DECODE_FLAGS[scale])
+    if img is None:
+        raise ValueError(f"Image at {path} could not be loaded.")
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def downsample(frames):
+    """Halve the resolution of an (N, H, W, C) image stack by averaging 2x2 blocks."""
+    n, h, w, c = frames.shape
+    blocks = frames[:, : h // 2 * 2, : w // 2 * 2].reshape(n, h // 2, 2, w // 2, 2, c)
+    if frames.dtype == np.uint8:
+        summed = blocks.sum(axis=(2, 4), dtype=np.uint16)
+        return ((summed + 2) // 4).astype(np.uint8)
+    return blocks.mean(axis=(2, 4)).astype(frames.dtype)
+
+
+def downscale(frames, scale):
+    """Reduce an (N, H, W, C) image stack to 1/scale resolution (scale a power of two)."""
+    while scale > 1:
+        frames = downsample(frames)
+        scale //= 2
+    return frames
+
+
+def reduced_decode_scale(paths, scale):
+    """
+    Scale to decode paths at when the frames are wanted at 1/scale resolution: scale if every file
+    is a JPEG, so all are shrunk in the DCT domain, otherwise 1, so all are decoded at full size and
+    shrunk with downscale(). Pass every file whose frames are compared to each other.
+    """
+    if scale != 1 and all(os.path.splitext(path)[1].lower() in JPEG_EXTENSIONS for path in paths):
+        return scale
+    return 1
+
+
+def decode_into(path, out, scale=1):
+    """Decode the image at path, at 1/scale resolution, into the preallocated array out."""
+    img = decode_image(path, scale)
+    if img.shape != out.shape:
+        raise ValueError(
+            f"Image {path} has shape {img.shape}, expected {out.shape}. "
+            "All images in a folder must have the same dimensions."
+        )
+    out[...] = img
+
+
+def decode_images(paths, num_workers=None, out=None, scale=1):
+    """
+    Decode a list of image files into one (N, H, W, C) uint8 array using a pool of threads, at
+    1/scale resolution. The first image sets the frame shape. If out is given, frames are written
+    into it instead.
+    """
+    if len(paths) == 0:
+        return np.empty((0, 0, 0, 0), dtype=np.uint8) if out is None else out[:0]
+    skip = 0
+    if out is None:
+        first = decode_image(paths[0], scale)
+        out = np.empty((len(paths),) + first.shape, dtype=first.dtype)
+        # The first image is already decoded
+        out[0] = first
+        skip = 1
+    with ThreadPoolExecutor(max_workers=num_workers or default_decode_workers()) as executor:
+        futures = [
+            executor.submit(decode_into, path, out[i], scale)
+            for i, path in enumerate(paths[skip:], start=skip)
+        ]
+        for f in futures:
+            f.result()
+    return out[: len(paths)]
+
+
+class FrameLoader:
+    """
+    Iterate over batches of decoded frames: yields (start index, (n, H, W, C) uint8 array).
+
+    Two batch buffers are allocated once and reused. While the caller works on one batch, the
+    worker threads decode the next batch into the other buffer. A yielded array is only valid until
+    the next batch is requested, so copy it if it needs to outlive the current iteration.
+    """
+
+    def __init__(self, paths, batch_size, num_workers=None, scale=1):
+        self.paths = list(paths)
+        self.batch_size = batch_size
+        self.num_workers = num_workers or default_decode_workers()
+        self.scale = scale
+        self.buffers = None
+
+    def __len__(self):
+        return -(-len(self.paths) // self.batch_size)
+
+    def _submit(self, executor, batch_index, first=None):
+        """Start decoding a batch. first is its already decoded first frame, if any."""
+        start = batch_index * self.batch_size
+        batch_paths = self.paths[start : start + self.batch_size]
+        buffer = self.buffers[batch_index % 2]
+        skip = 0
+        if first is not None:
+            buffer[0] = first
+            skip = 1
+        futures = [
+            executor.submit(decode_into, path, buffer[i], self.scale)
+            for i, path in enumerate(batch_paths[skip:], start=skip)
+        ]
+        return start, buffer[: len(batch_paths)], futures
+
+    def __iter__(self):
+        if not self.paths:
+            return
+        first = None
+        if self.buffers is None:
+            # The first frame sets the buffer shape and is reused as the first frame of batch 0
+            first = decode_image(self.paths[0], self.scale)
+            shape = (min(self.batch_size, len(self.paths)),) + first.shape
+            self.buffers = [np.empty(shape, dtype=first.dtype) for _ in range(2)]
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            pending = self._submit(executor, 0, first)
+            for batch_index in range(len(self)):
+                start, frames, futures = pending
+                for f in futures:
+                    f.result()
+                # Start decoding the next batch before handing this one to the caller
+                if batch_index + 1 < len(self):
+                    pending = self._submit(executor, batch_index + 1)
+                yield start, frames
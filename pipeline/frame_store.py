@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+Persistent store of decoded frames for an image folder.
+
+All frames of the folder are decoded once into a single (N, H, W, C) uint8 .npy file that is opened
+memory-mapped, next to an index of the frame numbers. The index also records the name, size and
+mtime of every source image, and the store is rebuilt automatically when any of them change. Slices
+of consecutive frames are zero-copy views into the memory map.
+
+By default the store lives in a hidden .frame_store folder inside the image folder. Run this file
+directly to build (or refresh) the store of a folder ahead of time.
+"""
+
+import os
+import json
+import hashlib
+import argparse
+
+import numpy as np
+
+from frame_loader import decode_images
+
+STORE_DIRNAME = ".frame_store"
+FRAMES_FILENAME = "frames.npy"
+INDEX_FILENAME = "index.json"
+# Number of frames decoded at a time while building the store
+BUILD_BATCH_SIZE = 64
+
+
+def parse_frame_number(filename):
+    """Frame number of a file named like frame_00741.jpg, or -1 if it cannot be parsed."""
+    try:
+        return int(filename.split("_")[-1].split(".")[0])
+    except ValueError:
+        return -1
+
+
+def folder_signature(folder):
+    """Sorted image filenames of a folder and a digest of their names, sizes and mtimes."""
+    filenames = sorted(f for f in os.listdir(folder) if f.endswith(".png") or f.endswith(".jpg"))
+    digest = hashlib.blake2b(digest_size=20)
+    for filename in filenames:
+        stat = os.stat(os.path.join(folder, filename))
+        digest.update(f"{filename}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return filenames, digest.hexdigest()
+
+
+class FrameStore:
+    """
+    Memory-mapped decoded frames of one image folder.
+
+    frames is the read-only (N, H, W, C) uint8 memory map and frame_nums the (N,) frame numbers, in
+    filename order. Use FrameStore.open to get an up to date store.
+    """
+
+    def __init__(self, store_dir):
+        with open(os.path.join(store_dir, INDEX_FILENAME), "r") as f:
+            self.index = json.load(f)
+        self.store_dir = store_dir
+        self.frames = np.load(os.path.join(store_dir, FRAMES_FILENAME), mmap_mode="r")
+        self.frame_nums = np.array(self.index["frame_nums"], dtype=int)
+        self.filenames = self.index["filenames"]
+
+    @classmethod
+    def open(cls, folder, store_dir=None, num_workers=None):
+        """Open the store of folder, building or rebuilding it if the source images changed."""
+        if store_dir is None:
+            store_dir = os.path.join(folder, STORE_DIRNAME)
+        filenames, signature = folder_signature(folder)
+
+        index_path = os.path.join(store_dir, INDEX_FILENAME)
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            if index.get("signature") == signature:
+                return cls(store_dir)
+            print(f"Images in {folder} changed, rebuilding frame store...")
+        else:
+            print(f"Building frame store for {folder}...")
+
+        build_store(folder, filenames, signature, store_dir, num_workers)
+        return cls(store_dir)
+
+    def __len__(self):
+        return len(self.frame_nums)
+
+    def rows(self, frame_numbers):
+        """Row indices of the given frame numbers. Raises KeyError for frames not in the store."""
+        frame_numbers = np.asarray(frame_numbers, dtype=int)
+        order = np.argsort(self.frame_nums, kind="stable")
+        positions = np.searchsorted(self.frame_nums, frame_numbers, sorter=order)
+        positions = np.clip(positions, 0, len(order) - 1)
+        rows = order[positions]
+        missing = self.frame_nums[rows] != frame_numbers
+        if np.any(missing):
+            raise KeyError(f"Frames not in store {self.store_dir}: {frame_numbers[missing][:10]}")
+        return rows
+
+    def select(self, frame_numbers=None):
+        """
+        Frames with the given frame numbers, in that order. Consecutive runs of frames (the usual
+        case) are returned as zero-copy views of the memory map, anything else as a copy.
+        """
+        if frame_numbers is None:
+            return self.frames
+        rows = self.rows(frame_numbers)
+        if len(rows) == 0:
+            return self.frames[:0]
+        step = rows[1] - rows[0] if len(rows) > 1 else 1
+        if step != 0 and np.all(np.diff(rows) == step):
+            stop = rows[-1] + step
+            return self.frames[rows[0] : (stop if stop >= 0 else None) : step]
+        return self.frames[rows]
+
+
+def build_store(folder, filenames, signature, store_dir, num_workers=None):
+    """Decode all images of folder into a new store, replacing any previous one."""
+    os.makedirs(store_dir, exist_ok=True)
+    paths = [os.path.join(folder, filename) for filename in filenames]
+    first = decode_images(paths[:1])
+    shape = (len(paths),) + first.shape[1:]
+
+    # Write to temporary files and rename them into place, so an interrupted build is never used
+    frames_tmp = os.path.join(store_dir, FRAMES_FILENAME + ".tmp")
+    frames = np.lib.format.open_memmap(frames_tmp, mode="w+", dtype=first.dtype, shape=shape)
+    for start in range(0, len(paths), BUILD_BATCH_SIZE):
+        batch = paths[start : start + BUILD_BATCH_SIZE]
+        decode_images(batch, num_workers=num_workers, out=frames[start : start + len(batch)])
+    frames.flush()
+    del frames
+
+    index = {
+        "signature": signature,
+        "filenames": filenames,
+        "frame_nums": [parse_frame_number(filename) for filename in filenames],
+        "shape": list(shape),
+    }
+    index_tmp = os.path.join(store_dir, INDEX_FILENAME + ".tmp")
+    with open(index_tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(frames_tmp, os.path.join(store_dir, FRAMES_FILENAME))
+    os.replace(index_tmp, os.path.join(store_dir, INDEX_FILENAME))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the frame store of a folder.")
+    parser.add_argument("folder", type=str, help="Image folder")
+    parser.add_argument(
+        "--store_dir",
+        type=str,
+        default=None,
+        help=f"Store folder (default: folder/{STORE_DIRNAME})",
+    )
+    args = parser.parse_args()
+
+    store = FrameStore.open(args.folder, args.store_dir)
+    print(f"Frame store {store.store_dir}: {store.frames.shape} {store.frames.dtype}")
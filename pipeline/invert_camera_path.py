@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Map the poses of a nerfstudio camera path back to the world (COLMAP) coordinates of the transforms file.
+
+This is the inverse of create_camera_path.py: every camera of the path (the "camera_path" entries,
+or the viewer "keyframes") is unscaled, mapped through the closed-form inverse of the
+dataparser_transforms.json transform and has its y / z axis swap undone, all in one batched
+operation. With --check, the poses are compared to the transforms file they were generated from,
+matched by frame number.
+
+Examples:
+    ./invert_camera_path.py eval_path.json dataparser_transforms.json --output eval_poses.json
+    ./invert_camera_path.py eval_path.json dataparser_transforms.json --check full_transforms.json
+"""
+
+import json
+import argparse
+
+import numpy as np
+
+from transforms_index import TransformsIndex
+from camera_path import load_dataparser_transform, poses_path, rf_to_colmap
+from serialization import add_serialization_arguments, dump_json, save_poses
+
+
+def load_path_poses(path, use_keyframes=False):
+    """
+    Radiance field poses (N, 4, 4) of a camera path json and their frame numbers (N,), -1 where a
+    camera has none. Reads the "camera_path" cameras (row-major camera_to_world), or the "keyframes"
+    if there are no cameras or use_keyframes is set. Keyframe matrices saved by the viewer as a json
+    string are column-major, like three.js stores them.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    if "camera_path" in data and not use_keyframes:
+        cameras = data["camera_path"]
+        poses = np.array([camera["camera_to_world"] for camera in cameras], dtype=np.float64)
+        poses = poses.reshape(-1, 4, 4)
+    elif "keyframes" in data:
+        cameras = data["keyframes"]
+        matrices = [keyframe["matrix"] for keyframe in cameras]
+        poses = np.array(
+            [json.loads(m) if isinstance(m, str) else m for m in matrices], dtype=np.float64
+        ).reshape(-1, 4, 4)
+        is_string = np.array([isinstance(m, str) for m in matrices], dtype=bool)
+        poses[is_string] = np.swapaxes(poses[is_string], -1, -2)
+    else:
+        raise KeyError(f"{path} has no camera_path or keyframes")
+
+    frame_nums = np.array([camera.get("frame_num", -1) for camera in cameras], dtype=int)
+    return poses, frame_nums
+
+
+def check_poses(poses, frame_nums, transforms_path):
+    """
+    Compare world poses to the poses of the same frames in a transforms file. Returns the number of
+    matched frames and the largest absolute rotation and translation errors.
+    """
+    index = TransformsIndex.open(transforms_path)
+    order = np.argsort(index.frame_nums, kind="stable")
+    positions = np.searchsorted(index.frame_nums[order], frame_nums)
+    positions = np.minimum(positions, len(order) - 1)
+    rows = order[positions]
+    matched = (frame_nums >= 0) & (index.frame_nums[rows] == frame_nums)
+    if not matched.any():
+        return 0, np.nan, np.nan
+
+    errors = np.abs(poses[matched] - index.poses[rows[matched]])
+    return int(matched.sum()), errors[:, :3, :3].max(), errors[:, :3, 3].max()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Map the poses of a camera path back to world coordinates."
+    )
+    parser.add_argument("camera_path", type=str, help="Camera path json")
+    parser.add_argument(
+        "dataparser_transforms",
+        type=str,
+        help="dataparser_transforms.json of the model the camera path was made for",
+    )
+    parser.add_argument("--output", type=str, default=None, help="Output json with the world poses")
+    parser.add_argument(
+        "--keyframes",
+        action="store_true",
+        help="Use the viewer keyframes instead of the camera_path cameras",
+    )
+    parser.add_argument(
+        "--check",
+        type=str,
+        default=None,
+        help="Transforms file (e.g. full_transforms.json) to compare the poses to, by frame number",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-6,
+        help="Largest absolute error accepted by --check",
+    )
+    add_serialization_arguments(parser)
+    args = parser.parse_args()
+
+    T_c_rf, frame_nums = load_path_poses(args.camera_path, args.keyframes)
+    T_w_c = rf_to_colmap(T_c_rf, *load_dataparser_transform(args.dataparser_transforms))
+    print(f"Mapped {len(T_w_c)} poses of {args.camera_path} to world coordinates")
+
+    if args.output is not None:
+        frames = [
+            {"frame_num": int(frame_num), "transform_matrix": matrix}
+            for frame_num, matrix in zip(frame_nums, T_w_c.tolist())
+        ]
+        dump_json({"frames": frames}, args.output, args.compact, args.precision)
+        if args.binary:
+            save_poses(poses_path(args.output), T_w_c, frame_nums, {"source": args.camera_path})
+        print(f"Saved world poses to {args.output}")
+
+    if args.check is not None:
+        num_matched, rotation_error, translation_error = check_poses(T_w_c, frame_nums, args.check)
+        if num_matched == 0:
+            raise SystemExit(f"No camera of {args.camera_path} has a frame number in {args.check}")
+        print(
+            f"{num_matched}/{len(T_w_c)} poses matched in {args.check}: "
+            f"max rotation error {rotation_error:.3g}, max translation error {translation_error:.3g}"
+        )
+        if max(rotation_error, translation_error) > args.tolerance:
+            raise SystemExit(f"Round trip error above tolerance {args.tolerance}")
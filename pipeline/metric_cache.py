@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+On-disk cache of per-frame metric scores for eval_pipeline.py.
+
+Entries are keyed by a content hash of (render frame, ground truth frame, metric, metric
+parameters), so re-running an evaluation only computes scores for frame pairs or metrics that
+changed. The cache is a single sqlite file. File digests are remembered by (path, size, mtime) so
+unchanged files are not re-hashed, and the least recently used entries are evicted once the file
+grows past a size limit.
+
+Run this file directly to print cache statistics or invalidate entries.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+
+# Default size limit of the cache file
+DEFAULT_MAX_BYTES = 256 * 1024**2
+# Fraction of the entries dropped at once when the cache is over its size limit
+EVICT_FRACTION = 0.1
+
+
+def hash_file(path, block_size=1024**2):
+    """Hex blake2b digest of a file's contents."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(render_digest, gt_digest, metric, params):
+    """Cache key for a (render frame, ground truth frame, metric, metric parameters) combination."""
+    payload = json.dumps([render_digest, gt_digest, metric, params], sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+
+class MetricCache:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS scores (
+                key TEXT PRIMARY KEY,
+                render_digest TEXT,
+                gt_digest TEXT,
+                metric TEXT,
+                value REAL,
+                last_used REAL
+            );
+            CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used);
+            CREATE INDEX IF NOT EXISTS scores_metric ON scores (metric);
+            CREATE TABLE IF NOT EXISTS file_digests (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                digest TEXT
+            );
+            """
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def file_digests(self, paths):
+        """Content digests of files. Files with unchanged size and mtime are not re-read."""
+        digests = []
+        updates = []
+        for path in paths:
+            path = os.path.abspath(path)
+            stat = os.stat(path)
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, digest FROM file_digests WHERE path = ?", (path,)
+            ).fetchone()
+            if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                digests.append(row[2])
+            else:
+                digest = hash_file(path)
+                digests.append(digest)
+                updates.append((path, stat.st_size, stat.st_mtime_ns, digest))
+        if updates:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO file_digests VALUES (?, ?, ?, ?)", updates
+                )
+        return digests
+
+    def get_many(self, keys):
+        """Return a dict of the cached values for the given keys. Missing keys are left out."""
+        found = {}
+        keys = list(keys)
+        # Stay under sqlite's limit on the number of query parameters
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT key, value FROM scores WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE scores SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+                )
+        return found
+
+    def put_many(self, entries):
+        """Store (key, render_digest, gt_digest, metric, value) entries, evicting if needed."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)",
+                [(k, r, g, m, float(v), now) for k, r, g, m, v in entries],
+            )
+        self.evict()
+
+    def size_bytes(self):
+        """Bytes of the cache file in use, not counting free pages."""
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count - freelist) * page_size
+
+    def evict(self):
+        """Drop the least recently used entries until the cache is within max_bytes."""
+        evicted = 0
+        while self.size_bytes() > self.max_bytes:
+            count = self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+            if count == 0:
+                break
+            n = max(1, int(count * EVICT_FRACTION))
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM scores WHERE key IN "
+                    "(SELECT key FROM scores ORDER BY last_used LIMIT ?)",
+                    (n,),
+                )
+            evicted += n
+        if evicted:
+            self.conn.execute("VACUUM")
+        return evicted
+
+    def invalidate(self, metric=None, digests=None):
+        """
+        Remove cached scores. With no arguments everything is removed; otherwise only entries for
+        the given metric and/or involving any of the given file digests.
+        """
+        conditions = []
+        params = []
+        if metric is not None:
+            conditions.append("metric = ?")
+            params.append(metric)
+        if digests is not None:
+            digests = list(digests)
+            placeholders = ",".join("?" * len(digests))
+            conditions.append(
+                f"(render_digest IN ({placeholders}) OR gt_digest IN ({placeholders}))"
+            )
+            params.extend(digests + digests)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.conn:
+            removed = self.conn.execute(f"DELETE FROM scores{where}", params).rowcount
+            if metric is None and digests is None:
+                self.conn.execute("DELETE FROM file_digests")
+        return removed
+
+    def stats(self):
+        counts = dict(
+            self.conn.execute("SELECT metric, COUNT(*) FROM scores GROUP BY metric").fetchall()
+        )
+        return {"entries": counts, "size_bytes": self.size_bytes(), "max_bytes": self.max_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate a metric cache.")
+    parser.add_argument("cache_path", type=str, help="Path to the cache file")
+    parser.add_argument("--clear", action="store_true", help="Remove cached scores")
+    parser.add_argument("--metric", type=str, default=None, help="Only clear scores of this metric")
+    parser.add_argument(
+        "--folder",
+        type=str,
+        default=None,
+        help="Only clear scores involving the current contents of the images in this folder",
+    )
+    args = parser.parse_args()
+
+    cache = MetricCache(args.cache_path)
+    if args.clear:
+        digests = None
+        if args.folder is not None:
+            paths = [
+                os.path.join(args.folder, f)
+                for f in sorted(os.listdir(args.folder))
+                if f.endswith(".png") or f.endswith(".jpg")
+            ]
+            digests = cache.file_digests(paths)
+        removed = cache.invalidate(metric=args.metric, digests=digests)
+        print(f"Removed {removed} cached scores from {args.cache_path}")
+    print(json.dumps(cache.stats(), indent=4))
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
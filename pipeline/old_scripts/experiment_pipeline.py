@@ -4,8 +4,11 @@ OLD CODE. NOT USED IN THE FINAL PIPELINE
 
 Python code for keyframe extraction
 
-Extracts frames from a video file and saves them as image files in a specified folder.
-Selects keyframes from the extracted frames based on a specified percentage and a specified algorithm.
+Selects keyframes from each video based on a specified percentage and a specified algorithm, and
+extracts only the selected frames, in one pass over the video. Videos, and time segments of long
+videos (config "segment_frames"), are extracted in parallel by a pool of config "workers" processes
+(default: one per core). Frames are counted exactly unless config "exact_frame_count" is false, and
+each keyframe folder only appears once all of its frames were extracted.
 
 Runs using system python3 by default
 Run with own python interpreter if needed
@@ -16,9 +19,20 @@ r - randomly selected frames
 """
 
 import os
-from frame_extraction import extract_frames
-from keyframe_selection import select_keyframes
-from utils import get_config, get_immediate_subdirectories, export_to_txt
+import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+
+from frame_extraction import count_frames, extract_keyframes
+from keyframe_selection import keyframe_indices
+from utils import get_config, export_to_txt
+
+# Videos longer than this many frames are split into segments that are extracted in parallel
+DEFAULT_SEGMENT_FRAMES = 3000
+# Keyframes are extracted into <kf folder><suffix> and renamed once every segment of the video succeeded
+TMP_FOLDER_SUFFIX = ".tmp"
 
 
 def main():
@@ -37,41 +51,115 @@ def main():
     if repo_path == "":
         raise ValueError("Repo path not found. Set repo path in config.yaml")
 
-    # extract frames and select keyframes
-    FRAMES_FOLDER = os.path.join(repo_path, "data", "frames")
+    # Jobs run in one process pool: a frame count job per video, a selection job per video,
+    # percentage and algorithm, then an extraction job per time segment of each video
+    num_workers = config.get("workers") or os.cpu_count()
+    segment_frames = config.get("segment_frames", DEFAULT_SEGMENT_FRAMES)
+    # The container header frame count is only an estimate for some videos. By default the frames
+    # are counted exactly (one grab() pass per video); set exact_frame_count: false to trust it
+    exact_frame_count = config.get("exact_frame_count", True)
     KF_FOLDER = os.path.join(repo_path, "data", "keyframes")
-    for video_path in video_paths:
-        if video_path == "":
-            continue
-        extract_frames(
-            video_path, os.path.join(FRAMES_FOLDER, os.path.basename(video_path).split(".")[0])
-        )
-
-    # get frame folders for each video and select keyframes according to desired percentages and algorithms
-    vid_frame_folders = get_immediate_subdirectories(FRAMES_FOLDER)
     kf_folder_paths = []
     processed_folder_paths = []  # output folders for Colmap (ns-process) processing
-    for vid_frame_folder in vid_frame_folders:
-        for percent in percentages:
-            for algorithm in algorithms:
-                frame_folder_path = os.path.join(FRAMES_FOLDER, vid_frame_folder)
-                video_name = os.path.basename(vid_frame_folder)
-                kf_folder_path = os.path.join(KF_FOLDER, video_name, f"{int(percent)}p_{algorithm}")
-                processed_folder_path = os.path.join(
-                    repo_path, "data", "processed", video_name, f"{int(percent)}p_{algorithm}"
-                )
-                # check if keyframes already selected (i.e. kf folder already exists)
-                if os.path.exists(kf_folder_path):
-                    print(f"Keyframes already exist in '{kf_folder_path}'")
-                else:
-                    # if not, run keyframe selection algorithm
-                    fraction = percent / 100
-                    kf_idxs = select_keyframes(
-                        frame_folder_path, kf_folder_path, fraction, algorithm
+    video_paths = [video_path for video_path in video_paths if video_path != ""]
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        count_jobs = {
+            video_path: pool.submit(count_frames, video_path, exact_frame_count)
+            for video_path in video_paths
+        }
+        video_frames = {}
+
+        # select keyframes of each video according to desired percentages and algorithms
+        selection_jobs = {video_path: {} for video_path in video_paths}
+        seeds = iter(
+            np.random.SeedSequence().spawn(len(video_paths) * len(percentages) * len(algorithms))
+        )
+        for video_path in video_paths:
+            video_name = os.path.basename(video_path).split(".")[0]
+            num_frames = video_frames[video_path] = count_jobs[video_path].result()
+            for percent in percentages:
+                for algorithm in algorithms:
+                    seed = next(seeds)
+                    kf_folder_path = os.path.join(
+                        KF_FOLDER, video_name, f"{int(percent)}p_{algorithm}"
                     )
-                    print(f"Successfully added keyframes to '{kf_folder_path}'")
-                kf_folder_paths.append(kf_folder_path)
-                processed_folder_paths.append(processed_folder_path)
+                    processed_folder_path = os.path.join(
+                        repo_path, "data", "processed", video_name, f"{int(percent)}p_{algorithm}"
+                    )
+                    # check if keyframes already selected (i.e. kf folder already exists)
+                    if os.path.exists(kf_folder_path):
+                        print(f"Keyframes already exist in '{kf_folder_path}'")
+                    else:
+                        # if not, run keyframe selection algorithm
+                        fraction = percent / 100
+                        selection_jobs[video_path][kf_folder_path] = pool.submit(
+                            keyframe_indices, num_frames, fraction, algorithm, seed
+                        )
+                    kf_folder_paths.append(kf_folder_path)
+                    processed_folder_paths.append(processed_folder_path)
+
+        # extract the selected keyframes, splitting long videos into segments decoded in parallel
+        extraction_jobs = {}
+        for video_path, jobs in selection_jobs.items():
+            selections = {}
+            for kf_folder_path, job in jobs.items():
+                kf_idxs = job.result()
+                if kf_idxs is not None:
+                    # Start from an empty temporary folder, left over ones are from failed runs
+                    tmp_folder_path = kf_folder_path + TMP_FOLDER_SUFFIX
+                    shutil.rmtree(tmp_folder_path, ignore_errors=True)
+                    selections[tmp_folder_path] = kf_idxs
+            if not selections:
+                continue
+            num_frames = video_frames[video_path]
+            segment_jobs = []
+            for start in range(0, num_frames, segment_frames):
+                end = start + segment_frames
+                segment = {
+                    tmp_folder_path: kf_idxs[(kf_idxs >= start) & (kf_idxs < end)]
+                    for tmp_folder_path, kf_idxs in selections.items()
+                }
+                # The last segment also checks that the video ends where the selection expects
+                is_last = end >= num_frames
+                if is_last or any(len(kf_idxs) for kf_idxs in segment.values()):
+                    segment_jobs.append(
+                        pool.submit(
+                            extract_keyframes,
+                            video_path,
+                            segment,
+                            start_frame=start,
+                            num_frames=num_frames if is_last else None,
+                        )
+                    )
+            extraction_jobs[video_path] = (list(selections), segment_jobs)
+
+        # Keyframe folders only appear once all segments of their video were extracted, so a
+        # failed video is selected and extracted again on the next run
+        failed = []
+        for video_path, (tmp_folder_paths, segment_jobs) in extraction_jobs.items():
+            wait(segment_jobs)
+            errors = [job.exception() for job in segment_jobs if job.exception() is not None]
+            if errors:
+                print(f"Error: could not extract the keyframes of {video_path}: {errors[0]}")
+                for tmp_folder_path in tmp_folder_paths:
+                    shutil.rmtree(tmp_folder_path, ignore_errors=True)
+                failed.append(video_path)
+                continue
+            num_written = Counter()
+            for job in segment_jobs:
+                num_written.update(job.result())
+            for tmp_folder_path in tmp_folder_paths:
+                kf_folder_path = tmp_folder_path[: -len(TMP_FOLDER_SUFFIX)]
+                os.makedirs(tmp_folder_path, exist_ok=True)
+                os.rename(tmp_folder_path, kf_folder_path)
+                print(
+                    f"Successfully added {num_written[tmp_folder_path]} keyframes to '{kf_folder_path}'"
+                )
+
+    if failed:
+        raise RuntimeError(
+            f"Keyframe extraction failed for {len(failed)} video(s): {', '.join(failed)}"
+        )
 
     # export to txt
     export_to_txt(kf_folder_paths, "kf_folders.txt")
@@ -45,6 +45,119 @@ def extract_frames(video_path, output_folder):
         print(f"Warning: {frame_count - success_count} frames were not extracted.")
 
 
+def count_frames(video_path, exact=False):
+    """
+    Number of frames of a video, or 0 if it cannot be opened. By default this is the count in the
+    container header, which is only an estimate for some containers. With exact, or when the
+    header has no count, the frames are counted by grabbing every one of them (one pass over the
+    video, without converting the frames to images).
+    """
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        return 0
+    num_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    if exact or num_frames <= 0:
+        num_frames = 0
+        while video.grab():
+            num_frames += 1
+    video.release()
+    return num_frames
+
+
+def extract_keyframes(video_path, selections, jpeg_quality=95, start_frame=0, num_frames=None):
+    """
+    Extracts only the selected frames of a video, in a single pass over it.
+
+    selections maps each output folder to the frame indices to save there (e.g. from
+    keyframe_selection.keyframe_indices). Frames that no folder needs are skipped with grab(), so they
+    are never converted, encoded or written. A frame needed by several folders is encoded once.
+    Frames are named frame_XXXX.jpg like extract_frames names them. Returns the number of frames
+    written to each folder.
+
+    With start_frame, decoding starts by seeking to that frame, so segments of a long video can be
+    extracted in parallel. Every selected index must then be at least start_frame. If the position
+    read back after the seek is not start_frame, the frames up to it are grabbed one by one instead.
+
+    num_frames is the frame count the selection was made for (e.g. from count_frames). If it is
+    given, the video is checked to end exactly there. Raises a RuntimeError if a selected frame could
+    not be written or the video does not have num_frames frames, since the selection is then wrong.
+    """
+    wanted = {}
+    for output_folder, frame_indices in selections.items():
+        os.makedirs(output_folder, exist_ok=True)
+        for frame_index in frame_indices:
+            wanted.setdefault(int(frame_index), []).append(output_folder)
+    written = {output_folder: 0 for output_folder in selections}
+    if not wanted and num_frames is None:
+        return written
+
+    # Open the video file
+    video = cv2.VideoCapture(video_path)
+
+    # Check if the video opened successfully
+    if not video.isOpened():
+        raise IOError(f"Could not open video {video_path}")
+
+    if wanted and min(wanted) < start_frame:
+        raise ValueError(f"Selected frame {min(wanted)} is before start frame {start_frame}")
+    if start_frame > 0:
+        video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        if int(video.get(cv2.CAP_PROP_POS_FRAMES)) != start_frame:
+            # The seek did not land on start_frame (e.g. inexact seeking in H.264 / VFR footage), so
+            # files would be named after the wrong frames. Grab forward from the start instead
+            print(f"Warning: could not seek to frame {start_frame} of {video_path}, grabbing to it")
+            video.release()
+            video = cv2.VideoCapture(video_path)
+            for _ in range(start_frame):
+                if not video.grab():
+                    break
+
+    last_frame = max(wanted, default=start_frame - 1)
+    if num_frames is not None:
+        # Read up to the end the selection expects, plus one frame that must not exist
+        last_frame = max(last_frame, num_frames)
+    frame_count = start_frame
+    missing = []
+    while frame_count <= last_frame:
+        # Advance to the next frame without decoding it into an image
+        if not video.grab():
+            break
+
+        if frame_count in wanted:
+            ret, frame = video.retrieve()
+            params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+            ok, encoded = cv2.imencode(".jpg", frame, params) if ret else (False, None)
+            if ok:
+                for output_folder in wanted[frame_count]:
+                    frame_filename = os.path.join(output_folder, f"frame_{frame_count:04d}.jpg")
+                    encoded.tofile(frame_filename)
+                    written[output_folder] += 1
+            else:
+                missing.append(frame_count)
+        frame_count += 1
+
+    # Release the video capture object
+    video.release()
+    missing += [frame_index for frame_index in sorted(wanted) if frame_index >= frame_count]
+    if missing:
+        shown = ", ".join(str(frame_index) for frame_index in missing[:10])
+        shown += ", ..." if len(missing) > 10 else ""
+        raise RuntimeError(
+            f"Could not extract {len(missing)} selected frames of {video_path} "
+            f"(read frames {start_frame}-{frame_count - 1}): {shown}"
+        )
+    if num_frames is not None and frame_count != num_frames:
+        found = f"more than {num_frames}" if frame_count > num_frames else f"only {frame_count}"
+        raise RuntimeError(
+            f"{video_path} has {found} frames, but the selection was made for {num_frames}. "
+            f"Select from count_frames(video_path, exact=True) instead."
+        )
+    print(
+        f"Extracted {len(wanted)} selected frames of {video_path} "
+        f"in one pass over frames {start_frame}-{frame_count - 1}."
+    )
+    return written
+
 if __name__ == "__main__":
     # Example usage
     video_path = '20p.mp4'
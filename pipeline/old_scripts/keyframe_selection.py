@@ -6,9 +6,28 @@ Code for selecting keyframes from a video
 """
 
 import os
+import shutil
 import numpy as np
 
 
+def keyframe_indices(num_frames, percentage, algorithm="", seed=None):
+    """
+    Sorted indices of the frames an algorithm selects out of num_frames, or None if it is unknown.
+    seed seeds the random algorithm; without it numpy's global random state is used.
+    """
+    num_selected = int(num_frames * percentage)
+    if algorithm == "n":
+        # select evenly spaced frames
+        return np.linspace(0, num_frames - 1, num_selected, dtype=int)
+    elif algorithm == "r":
+        # select a random fraction of frames, but keep them in their original order
+        rng = np.random if seed is None else np.random.default_rng(seed)
+        frame_indices = rng.choice(num_frames, size=num_selected, replace=False)
+        frame_indices.sort()
+        return frame_indices
+    return None
+
+
 def select_keyframes(input_folder, output_folder, percentage, algorithm=""):
     # get list of all frames in order
     frames = [
@@ -23,15 +42,8 @@ def select_keyframes(input_folder, output_folder, percentage, algorithm=""):
         frames.sort(key=lambda f: os.path.basename(f).split(".")[0])
 
     # run frame selection algorithm
-    num_frames = int(len(frames) * percentage)
-    if algorithm == "n":
-        # select evenly spaced frames
-        frame_indices = np.linspace(0, len(frames) - 1, num_frames, dtype=int)
-    elif algorithm == "r":
-        # select a random fraction of frames, but keep them in their original order
-        frame_indices = np.random.choice(len(frames), size=num_frames, replace=False)
-        frame_indices.sort()
-    else:
+    frame_indices = keyframe_indices(len(frames), percentage, algorithm)
+    if frame_indices is None:
         return
     selected_frames = [frames[i] for i in frame_indices]
 
@@ -43,7 +55,7 @@ def select_keyframes(input_folder, output_folder, percentage, algorithm=""):
     for i, frame in enumerate(selected_frames):
         filename = os.path.basename(frame)
         output_filename = os.path.join(output_folder, filename)
-        os.system(f"cp {frame} {output_filename}")
+        shutil.copyfile(frame, output_filename)
 
     # return the indices of the selected frames for the future when we analyze different algorithms
     return frame_indices
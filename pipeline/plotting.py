@@ -8,6 +8,8 @@ from pathlib import Path
 
 # Configuration
 RESULTS_DIR = os.path.expanduser("results/")
+# Set to a results_store.py folder to load all runs from it instead of csv files
+RESULTS_STORE = None
 OUTPUT_DIR = "result_plots/"  # Change this to modify output directory
 STRATEGIES = ["random", "uniform", "cluster", "content", "motion"]
 PERCENTAGES = [0.5, 1, 3, 5, 10, 20, 30, 40, 50, 60, 70, 80, 90]
@@ -55,6 +57,30 @@ def load_data(results_dir):
     return data
 
 
+def load_data_from_store(store_dir):
+    """Load all runs of a results store into the same structure as load_data, in one read per column."""
+    from results_store import load_results, run_rows
+
+    columns, runs = load_results(store_dir)
+    data = {method: {strategy: {} for strategy in STRATEGIES} for method in METHODS}
+    for run in runs:
+        # Store runs keep the full method name, e.g. splatfacto -> splat
+        method = next((m for m in METHODS if run.get("method", "").startswith(m)), None)
+        strategy = run.get("strategy")
+        if method is None or strategy not in STRATEGIES or "percentage" not in run:
+            continue
+        # Preview runs (eval_pipeline.py --scale / --pyramid_levels) record their scale; only plot
+        # full resolution scores
+        if "scale" in run:
+            continue
+        rows = run_rows(columns, run["run_id"])
+        data[method][strategy][run["percentage"]] = pd.DataFrame(
+            {"FRAME": rows["frame"], **{metric: rows[metric.lower()] for metric in METRICS}}
+        )
+
+    return data
+
+
 def create_line_plots(data, output_dir):
     """Create line plots for each downsampling strategy showing metric trends."""
     print("Creating line plots...")
@@ -365,13 +391,17 @@ def main():
     # Create output directory if it doesn't exist
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    # Check if results directory exists
-    if not os.path.exists(RESULTS_DIR):
-        print(f"Error: Results directory not found at {RESULTS_DIR}")
-        return
+    if RESULTS_STORE is not None:
+        print(f"Loading data from results store {RESULTS_STORE}...")
+        data = load_data_from_store(RESULTS_STORE)
+    else:
+        # Check if results directory exists
+        if not os.path.exists(RESULTS_DIR):
+            print(f"Error: Results directory not found at {RESULTS_DIR}")
+            return
 
-    print(f"Loading data from {RESULTS_DIR}...")
-    data = load_data(RESULTS_DIR)
+        print(f"Loading data from {RESULTS_DIR}...")
+        data = load_data(RESULTS_DIR)
 
     # Check if any data was loaded
     data_found = False
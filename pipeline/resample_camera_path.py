@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+Densify or resample a camera path.
+
+Keyframe poses are read from a nerfstudio camera path json (e.g. transforms/camera_paths/lake_lag_spiral.json)
+or from a transforms file (e.g. full_transforms.json, optionally mapped to radiance field coordinates
+with a dataparser_transforms.json). The output path has any number of poses spread evenly over the
+keyframes: rotations are interpolated with batched quaternion SLERP and camera positions with a
+Catmull-Rom spline (or linearly), all vectorised over the output poses.
+
+Examples:
+    ./resample_camera_path.py ../transforms/camera_paths/lake_lag_spiral.json spiral_dense.json --num_poses 2000
+    ./resample_camera_path.py full_transforms.json eval_path.json --frames 741 972 --dataparser dataparser_transforms.json --fps 60
+"""
+
+import json
+import argparse
+
+import numpy as np
+
+from transforms_index import TransformsIndex
+from camera_path import camera_path_header, colmap_to_rf, load_dataparser_transform, poses_path
+from serialization import add_serialization_arguments, dump_json, save_poses
+
+# Below this angle between two quaternions SLERP falls back to normalised linear interpolation
+SLERP_LINEAR_THRESHOLD = 1e-6
+
+
+def matrices_to_quaternions(R):
+    """
+    Unit quaternions (x, y, z, w) of an (N, 3, 3) stack of rotation matrices, as the eigenvector of
+    the largest eigenvalue of each matrix's symmetric 4x4 Bar-Itzhack matrix. Batched and robust
+    to slightly non-orthonormal input.
+    """
+    Q = R
+    K = np.empty((len(R), 4, 4))
+    K[:, 0, 0] = Q[:, 0, 0] - Q[:, 1, 1] - Q[:, 2, 2]
+    K[:, 1, 1] = Q[:, 1, 1] - Q[:, 0, 0] - Q[:, 2, 2]
+    K[:, 2, 2] = Q[:, 2, 2] - Q[:, 0, 0] - Q[:, 1, 1]
+    K[:, 3, 3] = Q[:, 0, 0] + Q[:, 1, 1] + Q[:, 2, 2]
+    K[:, 0, 1] = K[:, 1, 0] = Q[:, 1, 0] + Q[:, 0, 1]
+    K[:, 0, 2] = K[:, 2, 0] = Q[:, 2, 0] + Q[:, 0, 2]
+    K[:, 1, 2] = K[:, 2, 1] = Q[:, 2, 1] + Q[:, 1, 2]
+    K[:, 0, 3] = K[:, 3, 0] = Q[:, 2, 1] - Q[:, 1, 2]
+    K[:, 1, 3] = K[:, 3, 1] = Q[:, 0, 2] - Q[:, 2, 0]
+    K[:, 2, 3] = K[:, 3, 2] = Q[:, 1, 0] - Q[:, 0, 1]
+    _, eigenvectors = np.linalg.eigh(K / 3.0)
+    # eigh sorts eigenvalues in ascending order
+    return eigenvectors[:, :, -1]
+
+
+def quaternions_to_matrices(q):
+    """(N, 3, 3) rotation matrices of an (N, 4) stack of unit quaternions (x, y, z, w)."""
+    x, y, z, w = q.T
+    R = np.empty((len(q), 3, 3))
+    R[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    R[:, 0, 1] = 2 * (x * y - z * w)
+    R[:, 0, 2] = 2 * (x * z + y * w)
+    R[:, 1, 0] = 2 * (x * y + z * w)
+    R[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    R[:, 1, 2] = 2 * (y * z - x * w)
+    R[:, 2, 0] = 2 * (x * z - y * w)
+    R[:, 2, 1] = 2 * (y * z + x * w)
+    R[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def make_continuous(q):
+    """Flip quaternion signs so consecutive keyframes are in the same hemisphere (shortest arcs)."""
+    dots = np.einsum("ij,ij->i", q[1:], q[:-1])
+    signs = np.concatenate([[1.0], np.cumprod(np.where(dots < 0, -1.0, 1.0))])
+    return q * signs[:, None]
+
+
+def slerp(q0, q1, u):
+    """Batched spherical linear interpolation between (N, 4) quaternions q0 and q1 at (N,) fractions u."""
+    dot = np.clip(np.einsum("ij,ij->i", q0, q1), -1.0, 1.0)
+    theta = np.arccos(dot)
+    sin_theta = np.sin(theta)
+    small = sin_theta < SLERP_LINEAR_THRESHOLD
+    safe_sin = np.where(small, 1.0, sin_theta)
+    w0 = np.where(small, 1.0 - u, np.sin((1.0 - u) * theta) / safe_sin)
+    w1 = np.where(small, u, np.sin(u * theta) / safe_sin)
+    q = w0[:, None] * q0 + w1[:, None] * q1
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def catmull_rom(points, segment, u):
+    """
+    Uniform Catmull-Rom spline through (K, D) points, evaluated in segment (N,) at fractions u (N,).
+    The ends are extended by reflecting the neighbouring point, so the curve passes through every point.
+    """
+    padded = np.concatenate([2 * points[:1] - points[1:2], points, 2 * points[-1:] - points[-2:-1]])
+    p0, p1, p2, p3 = (padded[segment + i] for i in range(4))
+    u = u[:, None]
+    return 0.5 * (
+        2 * p1
+        + (p2 - p0) * u
+        + (2 * p0 - 5 * p1 + 4 * p2 - p3) * u**2
+        + (3 * p1 - p0 - 3 * p2 + p3) * u**3
+    )
+
+
+def resample_poses(poses, num_poses, spline="catmull_rom", is_cycle=False):
+    """
+    Resample a (K, 4, 4) stack of keyframe poses to (num_poses, 4, 4) poses spread evenly over the
+    keyframes. Returns the poses and the (num_poses,) keyframe parameter t of each, in [0, K - 1]
+    (or [0, K] for a cycle, which returns to the first keyframe).
+    """
+    poses = np.asarray(poses, dtype=np.float64)
+    if is_cycle:
+        poses = np.concatenate([poses, poses[:1]])
+    if len(poses) == 1:
+        return np.repeat(poses, num_poses, axis=0), np.zeros(num_poses)
+
+    t = np.linspace(0, len(poses) - 1, num_poses)
+    segment = np.minimum(t.astype(int), len(poses) - 2)
+    u = t - segment
+
+    q = make_continuous(matrices_to_quaternions(poses[:, :3, :3]))
+    positions = poses[:, :3, 3]
+    resampled = np.zeros((num_poses, 4, 4))
+    resampled[:, :3, :3] = quaternions_to_matrices(slerp(q[segment], q[segment + 1], u))
+    if spline == "catmull_rom" and len(poses) > 2:
+        resampled[:, :3, 3] = catmull_rom(positions, segment, u)
+    else:
+        u = u[:, None]
+        resampled[:, :3, 3] = (1 - u) * positions[segment] + u * positions[segment + 1]
+    resampled[:, 3, 3] = 1.0
+    return resampled, t
+
+
+def load_keyframes(input_path, frame_range=None, dataparser_path=None):
+    """
+    Keyframe poses (K, 4, 4), per-keyframe fov (K,) and the camera path header of a camera path
+    json or a transforms file. Transforms poses are limited to frame_range (first, last) if given
+    and mapped to radiance field coordinates if a dataparser_transforms.json is given.
+    """
+    with open(input_path, "r") as f:
+        data = json.load(f)
+
+    if "camera_path" in data:
+        header = {key: value for key, value in data.items() if key != "camera_path"}
+        cameras = data["camera_path"]
+        poses = np.array([camera["camera_to_world"] for camera in cameras], dtype=np.float64)
+        fovs = np.array([camera.get("fov", header["default_fov"]) for camera in cameras])
+        return poses.reshape(-1, 4, 4), fovs, header
+
+    if "frames" not in data:
+        raise KeyError(f"{input_path} is neither a camera path nor a transforms file")
+    index = TransformsIndex.open(input_path)
+    rows = np.arange(len(index))
+    if frame_range is not None:
+        first, last = frame_range
+        rows = index.rows(np.arange(first, last + 1))
+    poses = index.poses[rows]
+    if dataparser_path is not None:
+        poses = colmap_to_rf(poses, *load_dataparser_transform(dataparser_path))
+    header = camera_path_header(index.header)
+    return poses, np.full(len(poses), header["default_fov"]), header
+
+
+def resample_camera_path(header, poses, fovs, num_poses, fps=None, spline="catmull_rom"):
+    """Camera path dict with num_poses poses resampled from the keyframe poses and fovs."""
+    resampled, t = resample_poses(poses, num_poses, spline, header.get("is_cycle", False))
+    if header.get("is_cycle", False):
+        fovs = np.concatenate([fovs, fovs[:1]])
+    fov = np.interp(t, np.arange(len(fovs)), fovs)
+
+    camera_path = dict(header)
+    if fps is not None:
+        camera_path["fps"] = float(fps)
+    # Keep the number of rendered frames (fps * seconds) equal to the number of poses
+    camera_path["seconds"] = num_poses / camera_path["fps"]
+    aspect = camera_path["render_width"] / camera_path["render_height"]
+    camera_path["camera_path"] = [
+        {"camera_to_world": matrix, "fov": camera_fov, "aspect": aspect}
+        for matrix, camera_fov in zip(resampled.reshape(num_poses, 16).tolist(), fov.tolist())
+    ]
+    return camera_path, resampled
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Densify or resample a camera path.")
+    parser.add_argument(
+        "input_path", type=str, help="Camera path json or transforms json with the keyframes"
+    )
+    parser.add_argument("output_path", type=str, help="Output camera path json")
+    parser.add_argument("--num_poses", type=int, default=None, help="Number of output poses")
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=None,
+        help="Output frame rate. Without --num_poses, the path keeps its duration and gets fps * seconds poses",
+    )
+    parser.add_argument(
+        "--spline",
+        type=str,
+        default="catmull_rom",
+        choices=["catmull_rom", "linear"],
+        help="Interpolation of the camera positions",
+    )
+    parser.add_argument(
+        "--frames",
+        type=int,
+        nargs=2,
+        default=None,
+        metavar=("FIRST", "LAST"),
+        help="Transforms input: range of frame numbers to use as keyframes",
+    )
+    parser.add_argument(
+        "--dataparser",
+        type=str,
+        default=None,
+        help="Transforms input: dataparser_transforms.json mapping the poses to radiance field coordinates",
+    )
+    add_serialization_arguments(parser)
+    args = parser.parse_args()
+
+    poses, fovs, header = load_keyframes(args.input_path, args.frames, args.dataparser)
+    num_poses = args.num_poses
+    if num_poses is None:
+        fps = args.fps or header["fps"]
+        num_poses = int(round(fps * header["seconds"]))
+
+    camera_path, resampled = resample_camera_path(
+        header, poses, fovs, num_poses, args.fps, args.spline
+    )
+    dump_json(camera_path, args.output_path, args.compact, args.precision)
+    if args.binary:
+        metadata = {key: value for key, value in camera_path.items() if key != "camera_path"}
+        save_poses(poses_path(args.output_path), resampled, np.arange(num_poses), metadata)
+    print(f"Resampled {len(poses)} keyframes to {num_poses} poses in {args.output_path}")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+"""
+Columnar store of per-frame evaluation results.
+
+A store is a folder with one raw little-endian binary file per column (run id, frame number and one
+column per metric) plus runs.json, which holds the metadata of every run (experiment, scene,
+strategy, percentage, method) and the offset and number of its rows. Appending a run appends a few bytes to each column file, and loading
+every run in the store is one np.fromfile per column. Scores are stored at full float64 precision.
+
+Run this file directly to list the runs, export them to csv, or import existing result csv files.
+
+Examples:
+    ./results_store.py list results/store
+    ./results_store.py export results/store results/csv
+    ./results_store.py import results/store results/pepperwood_preserve_fall/*.csv --scene pepperwood_preserve_fall
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+
+import numpy as np
+
+# Column name -> dtype of its file. Metric columns are NaN for runs that did not compute them
+COLUMNS = {
+    "run_id": np.dtype("<i4"),
+    "frame": np.dtype("<i4"),
+    "psnr": np.dtype("<f8"),
+    "ssim": np.dtype("<f8"),
+    "lpips": np.dtype("<f8"),
+}
+METRIC_COLUMNS = ["psnr", "ssim", "lpips"]
+RUNS_FILENAME = "runs.json"
+
+# Experiment names look like 10p_random_splatfacto or 05p_motion_splat
+EXPERIMENT_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)p_(.+)_((?:nerf|splat)[a-z]*)$")
+
+
+def parse_experiment_name(experiment_name):
+    """
+    Percentage, strategy and method encoded in an experiment name, e.g. "3p_katna_nerfacto" ->
+    {"percentage": 3.0, "strategy": "katna", "method": "nerfacto"}. A leading zero marks a fraction
+    of a percent ("05p" is 0.5%). Returns an empty dict for names that do not follow the pattern.
+    """
+    match = EXPERIMENT_PATTERN.match(experiment_name)
+    if match is None:
+        return {}
+    percent_str, strategy, method = match.groups()
+    if percent_str.startswith("0") and len(percent_str) > 1 and "." not in percent_str:
+        percent_str = "0." + percent_str[1:]
+    return {"percentage": float(percent_str), "strategy": strategy, "method": method}
+
+
+def column_path(store_dir, column):
+    return os.path.join(store_dir, f"{column}.bin")
+
+
+def load_runs(store_dir):
+    runs_path = os.path.join(store_dir, RUNS_FILENAME)
+    if not os.path.exists(runs_path):
+        return []
+    with open(runs_path, "r") as f:
+        return json.load(f)
+
+
+def stored_rows(store_dir, runs):
+    """
+    Number of column rows that belong to the recorded runs. Rows after them were left by an
+    interrupted append. Runs recorded without a row count are counted in the run_id column.
+    """
+    if all("rows" in run for run in runs):
+        return sum(run["rows"] for run in runs)
+    run_ids = np.fromfile(column_path(store_dir, "run_id"), dtype=COLUMNS["run_id"])
+    return int(np.count_nonzero(np.isin(run_ids, [run["run_id"] for run in runs])))
+
+
+def append_run(store_dir, frame_nums, scores, experiment_name, **metadata):
+    """
+    Append one run to the store. scores maps metric name to an (N,) array aligned with frame_nums.
+    Metadata not given explicitly is parsed from experiment_name. Returns the new run's id.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    runs = load_runs(store_dir)
+    run_id = max((run["run_id"] for run in runs), default=-1) + 1
+    offset = stored_rows(store_dir, runs)
+
+    n = len(frame_nums)
+    columns = {
+        "run_id": np.full(n, run_id),
+        "frame": np.asarray(frame_nums),
+    }
+    for metric in METRIC_COLUMNS:
+        values = scores.get(metric)
+        columns[metric] = np.full(n, np.nan) if values is None else np.asarray(values)
+        assert len(columns[metric]) == n, f"{metric} scores do not match the number of frames"
+
+    # Write the columns before the run metadata, so an interrupted append leaves no visible run.
+    # Rows of an earlier interrupted append are cut off first, they would end up in this run
+    for column, dtype in COLUMNS.items():
+        path = column_path(store_dir, column)
+        if os.path.exists(path) and os.path.getsize(path) > offset * dtype.itemsize:
+            os.truncate(path, offset * dtype.itemsize)
+        with open(path, "ab") as f:
+            f.write(columns[column].astype(dtype).tobytes())
+
+    run = {
+        "run_id": run_id,
+        "experiment": experiment_name,
+        "created": time.time(),
+        "offset": offset,
+        "rows": n,
+    }
+    run.update(parse_experiment_name(experiment_name))
+    run.update({key: value for key, value in metadata.items() if value is not None})
+    runs.append(run)
+    runs_tmp = os.path.join(store_dir, RUNS_FILENAME + ".tmp")
+    with open(runs_tmp, "w") as f:
+        json.dump(runs, f, indent=4)
+    os.replace(runs_tmp, os.path.join(store_dir, RUNS_FILENAME))
+    return run_id
+
+
+def load_results(store_dir, mmap=False):
+    """
+    Load every run in the store. Returns (columns, runs): columns maps column name to an array over
+    all frames of all runs, runs is the list of run metadata dicts. With mmap=True the columns are
+    memory-mapped instead of read.
+    """
+    runs = load_runs(store_dir)
+    columns = {}
+    for column, dtype in COLUMNS.items():
+        path = column_path(store_dir, column)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            columns[column] = np.empty(0, dtype=dtype)
+        elif mmap:
+            columns[column] = np.memmap(path, dtype=dtype, mode="r")
+        else:
+            columns[column] = np.fromfile(path, dtype=dtype)
+
+    # Drop rows of an append that was interrupted before its run was recorded
+    n = stored_rows(store_dir, runs)
+    if any(len(values) < n for values in columns.values()):
+        raise ValueError(f"Results store {store_dir} is missing rows of its runs")
+    if any(len(values) > n for values in columns.values()):
+        print(f"Warning: ignoring incomplete rows in results store {store_dir}")
+        columns = {column: values[:n] for column, values in columns.items()}
+    return columns, runs
+
+
+def run_rows(columns, run_id):
+    """Columns restricted to the rows of one run."""
+    mask = columns["run_id"] == run_id
+    return {column: values[mask] for column, values in columns.items()}
+
+
+def to_dataframe(store_dir):
+    """All runs as one pandas DataFrame, with the run metadata joined onto every frame row."""
+    import pandas as pd
+
+    columns, runs = load_results(store_dir)
+    frames = pd.DataFrame({column: np.asarray(values) for column, values in columns.items()})
+    return frames.merge(pd.DataFrame(runs), on="run_id", how="left")
+
+
+def export_csv(store_dir, output_dir):
+    """
+    Write one csv per experiment, named after it, with a FRAME column followed by the metric
+    columns the run computed, written with 10 significant digits. Only the latest full resolution
+    run of each experiment is exported; preview runs and earlier runs are skipped with a warning.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    columns, runs = load_results(store_dir)
+    latest = {}
+    skipped = []
+    for run in runs:
+        if "scale" in run:
+            skipped.append(run)
+            continue
+        if run["experiment"] in latest:
+            skipped.append(latest[run["experiment"]])
+        latest[run["experiment"]] = run
+    if skipped:
+        run_ids = ", ".join(str(run["run_id"]) for run in skipped)
+        print(f"Warning: not exporting preview or superseded runs {run_ids}")
+
+    for run in latest.values():
+        rows = run_rows(columns, run["run_id"])
+        metrics = [m for m in METRIC_COLUMNS if not np.all(np.isnan(rows[m]))]
+        data = np.column_stack([rows["frame"]] + [rows[m] for m in metrics])
+        fmt = ["%d"] + ["%.10g"] * len(metrics)
+        header = ",".join(["FRAME"] + [m.upper() for m in metrics])
+        output_csv = os.path.join(output_dir, f"{run['experiment']}.csv")
+        np.savetxt(output_csv, data, delimiter=",", fmt=fmt, header=header, comments="")
+        print(f"Exported run {run['run_id']} to {output_csv}")
+
+
+def import_csv(store_dir, csv_path, **metadata):
+    """Append a result csv written by eval_pipeline.py. Missing frame numbers are stored as -1."""
+    with open(csv_path, "r") as f:
+        header = f.readline().strip().split(",")
+    data = np.loadtxt(csv_path, delimiter=",", skiprows=1, ndmin=2)
+    scores = {name.lower(): data[:, i] for i, name in enumerate(header)}
+    frame_nums = scores.pop("frame", np.full(len(data), -1))
+    experiment_name = os.path.splitext(os.path.basename(csv_path))[0]
+    return append_run(store_dir, frame_nums, scores, experiment_name, **metadata)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, export or fill a results store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="List the runs in a store")
+    list_parser.add_argument("store_dir", type=str, help="Results store folder")
+
+    export_parser = subparsers.add_parser(
+        "export", help="Export the latest full resolution run of every experiment to csv"
+    )
+    export_parser.add_argument("store_dir", type=str, help="Results store folder")
+    export_parser.add_argument("output_dir", type=str, help="Folder for the csv files")
+
+    import_parser = subparsers.add_parser("import", help="Append existing result csv files")
+    import_parser.add_argument("store_dir", type=str, help="Results store folder")
+    import_parser.add_argument("csv_files", type=str, nargs="+", help="Result csv files")
+    import_parser.add_argument("--scene", type=str, default=None, help="Scene of the runs")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        columns, runs = load_results(args.store_dir)
+        for run in runs:
+            n = np.count_nonzero(columns["run_id"] == run["run_id"])
+            print(
+                f"{run['run_id']:5d}  {run['experiment']:40s} {n:6d} frames  {run.get('scene', '')}"
+            )
+    elif args.command == "export":
+        export_csv(args.store_dir, args.output_dir)
+    elif args.command == "import":
+        for csv_path in args.csv_files:
+            run_id = import_csv(args.store_dir, csv_path, scene=args.scene)
+            print(f"Imported {csv_path} as run {run_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,25 @@
 Given frame numbers selected as keyframes, retrieve frames from the processed data folder created by Colmap.
 """
 
-import json
 import os
 import shutil
-from utils import get_config
 import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from utils import get_config
+from transforms_index import TransformsIndex
+from serialization import add_serialization_arguments, dump_json
+
+# Methods tried in order by each copy_selected_images mode
+LINK_MODES = {
+    "copy": ["copy"],
+    "hardlink": ["hardlink", "copy"],
+    "reflink": ["reflink", "copy"],
+    "symlink": ["symlink", "copy"],
+    "auto": ["hardlink", "reflink", "copy"],
+}
+# ioctl request number of a Linux copy-on-write file clone
+FICLONE = 0x40049409
 
 
 def get_frames_data(original_json_path, selected_frame_numbers):
@@ -15,58 +29,136 @@ def get_frames_data(original_json_path, selected_frame_numbers):
     Extracts the frames with the selected frame numbers from the original transforms.json file and returns the new data
     as a dictionary. The new data can be written to a new file using the output_json_path.
     """
-    # Read the original transforms.json file
-    with open(original_json_path, "r") as f:
-        data = json.load(f)
+    # The transforms file is only parsed when it changed since its index was last built
+    index = TransformsIndex.open(original_json_path)
+    return index.frames_data(selected_frame_numbers)
 
-    # Convert selected frame numbers to strings with leading zeros
-    selected_frame_numbers_str = [f"{num:05d}" for num in selected_frame_numbers]
 
-    # Extract the frames that match the selected frame numbers
-    selected_frames = [
-        frame
-        for frame in data["frames"]
-        if frame["file_path"].split("/")[-1].split(".")[0].split("_")[-1]
-        in selected_frame_numbers_str
-    ]
+def create_output_json(new_data, output_json_path, compact=False, precision=None):
+    folder = os.path.dirname(output_json_path)
+    assert os.path.exists(folder), f"Output folder '{folder}' d.n.e., plz create it."
 
-    # Create a new dictionary with the same attributes as the original, but with the selected frames
-    new_data = {key: value for key, value in data.items() if key != "frames"}
-    new_data["frames"] = selected_frames
+    # Write the new data to the output_json_path. Will overwrite existing file.
+    dump_json(new_data, output_json_path, compact, precision)
 
-    return new_data
 
+def reflink(src_file, dst_file):
+    """Copy-on-write clone of src_file (Linux FICLONE, e.g. on btrfs or xfs). Raises OSError if unsupported."""
+    import fcntl
 
-def create_output_json(new_data, output_json_path):
-    folder = os.path.dirname(output_json_path)
-    assert os.path.exists(folder), f"Output folder '{folder}' d.n.e., plz create it."
+    with open(src_file, "rb") as src, open(dst_file, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(src_file, dst_file)
 
-    # Write the new data to the output_json_path. Will overwrite existing file.
-    with open(output_json_path, "w") as f:
-        json.dump(new_data, f, indent=4)
 
+def is_identical(src_file, dst_file):
+    """Whether dst_file already is src_file (a link to it) or a copy with the same size and mtime."""
+    if not os.path.exists(dst_file):
+        return False
+    if os.path.samefile(src_file, dst_file):
+        return True
+    src_stat, dst_stat = os.stat(src_file), os.stat(dst_file)
+    return src_stat.st_size == dst_stat.st_size and src_stat.st_mtime_ns == dst_stat.st_mtime_ns
 
-def copy_selected_images(original_images_folder, selected_frame_numbers, destination_folder):
+
+def materialize_file(src_file, dst_file, mode="copy"):
+    """
+    Make dst_file have the contents of src_file, with the first method of the mode that the
+    filesystem supports, and return the method used ("skipped" if dst_file was already identical).
+    """
+    if is_identical(src_file, dst_file):
+        return "skipped"
+    # Create the file under a temporary name and rename it over any previous destination. The name
+    # is unique per process, so concurrent runs into the same folder do not clobber each other
+    tmp_file = f"{dst_file}.{os.getpid()}.tmp"
+    for method in LINK_MODES[mode]:
+        try:
+            if os.path.lexists(tmp_file):
+                os.remove(tmp_file)
+            if method == "hardlink":
+                os.link(src_file, tmp_file)
+            elif method == "reflink":
+                reflink(src_file, tmp_file)
+            elif method == "symlink":
+                os.symlink(os.path.abspath(src_file), tmp_file)
+            else:
+                shutil.copy2(src_file, tmp_file)
+        except OSError:
+            if method == "copy":
+                raise
+            continue
+        os.replace(tmp_file, dst_file)
+        return method
+
+
+def copy_selected_images(
+    original_images_folder,
+    selected_frame_numbers,
+    destination_folder,
+    mode="copy",
+    num_workers=None,
+):
+    """
+    Materialise the selected frames in destination_folder, in parallel. mode is "copy", "hardlink",
+    "reflink", "symlink" or "auto" (hardlink, then reflink); links fall back to copies where the
+    filesystem does not support them. Frames that are already identical are skipped. Returns a
+    count of the files per method used, with missing source frames counted as "missing".
+    """
     # Convert selected frame numbers to strings with leading zeros
     selected_frame_numbers_str = [f"{num:05d}" for num in selected_frame_numbers]
 
     # Ensure the destination folder exists
     os.makedirs(destination_folder, exist_ok=True)
 
-    # Copy the selected images to the destination folder
+    jobs = []
+    missing = []
     for frame_number in selected_frame_numbers_str:
         src_file = os.path.join(original_images_folder, f"frame_{frame_number}.jpg")
         dst_file = os.path.join(destination_folder, f"frame_{frame_number}.jpg")
         if os.path.exists(src_file):
-            shutil.copy(src_file, dst_file)
+            jobs.append((src_file, dst_file))
         else:
-            print(f"Warning: {src_file} does not exist and will not be copied.")
+            missing.append(frame_number)
+
+    # Materialise the selected images in the destination folder
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        methods = list(executor.map(lambda job: materialize_file(*job, mode), jobs))
+    counts = Counter(methods)
+    print(
+        f"Materialised {len(jobs)} frames in {destination_folder}: "
+        + ", ".join(f"{count} {method}" for method, count in sorted(counts.items()))
+    )
+    if missing:
+        counts["missing"] = len(missing)
+        shown = ", ".join(missing[:10]) + (", ..." if len(missing) > 10 else "")
+        print(
+            f"Warning: {len(missing)} selected frames do not exist in {original_images_folder}: {shown}"
+        )
+    return counts
 
 
 def main():
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Write info of selected frames to json.")
     parser.add_argument("experiment_name", type=str, help="Name of the experiment")
+    add_serialization_arguments(parser, binary=False)
+    parser.add_argument(
+        "--images_from",
+        type=str,
+        default=None,
+        help="Folder with the original frames. If given, the selected frames are materialised in "
+        "the images folder next to the output transforms.json",
+    )
+    parser.add_argument(
+        "--mode",
+        type=str,
+        default="copy",
+        choices=list(LINK_MODES),
+        help="How frames are materialised with --images_from; links fall back to copies",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of threads materialising frames"
+    )
     args = parser.parse_args()
 
     # Load config.yaml variables
@@ -83,9 +175,15 @@ def main():
     output_json_path = os.path.join(config["proj_dir"], config["processed"], "transforms.json")
 
     new_data = get_frames_data(original_json_path, selected_frame_numbers)
-    create_output_json(new_data, output_json_path)
+    create_output_json(new_data, output_json_path, args.compact, args.precision)
     print("Selected frames info written to", output_json_path)
 
+    if args.images_from is not None:
+        images_folder = os.path.join(os.path.dirname(output_json_path), "images")
+        copy_selected_images(
+            args.images_from, selected_frame_numbers, images_folder, args.mode, args.workers
+        )
+
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+"""
+Select keyframes from the camera poses of a transforms file (e.g. full_transforms.json).
+
+A target percentage of the frames is picked with one of these strategies:
+    coverage - farthest point sampling in pose space (camera centre + view direction), so the
+               selected frames spread over every place and direction the drone looked from
+    motion   - a frame every time the cumulative camera motion (translation + rotation) since
+               the flight started grows by the same budget, so fast parts of the flight get more frames
+    uniform  - evenly spaced frame indices, like the old select_keyframes "n"
+    random   - random frames, like the old select_keyframes "r"
+
+Camera centres are measured in units of the RMS distance of the centres from their mean, and view
+directions (and rotations) in radians weighted by --rotation_weight. Everything is vectorised; the
+coverage strategy uses a KD-tree (scipy) to only update the frames near each new pick, which
+selects from 100k frames in seconds.
+
+The output has one frame number per line, the kf_nums_dir format retrieve_frames.py reads.
+
+Example:
+    ./select_keyframes.py full_transforms.json kf_nums/10p_coverage.txt --percentage 10 --strategy coverage
+"""
+
+import os
+import argparse
+
+import numpy as np
+
+from transforms_index import TransformsIndex
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+STRATEGIES = ["coverage", "motion", "uniform", "random"]
+
+
+def pose_features(poses, rotation_weight=1.0):
+    """
+    (N, 3) normalised camera centres and (N, 3) weighted view directions of (N, 4, 4) camera to world
+    poses. Cameras look down their -z axis, like in nerfstudio transforms files.
+    """
+    centres = poses[:, :3, 3]
+    centres = centres - centres.mean(axis=0)
+    extent = np.sqrt(np.mean(np.sum(centres**2, axis=1)))
+    if extent > 0:
+        centres = centres / extent
+    directions = -poses[:, :3, 2]
+    directions = directions / np.linalg.norm(directions, axis=1, keepdims=True)
+    return centres, rotation_weight * directions
+
+
+def farthest_point_sampling(points, num, start=0):
+    """
+    Indices of num points picked greedily so each is the farthest from the ones picked before.
+    With scipy installed, only the points within reach of each new pick are updated.
+    """
+    num = min(num, len(points))
+    selected = np.empty(num, dtype=int)
+    # Distance of every point to its nearest selected point
+    distances = np.full(len(points), np.inf)
+    tree = cKDTree(points) if cKDTree is not None else None
+    radius = np.inf
+    current = start
+    for i in range(num):
+        selected[i] = current
+        if tree is None or np.isinf(radius):
+            np.minimum(distances, np.linalg.norm(points - points[current], axis=1), out=distances)
+        else:
+            # Only points closer to the new pick than the current largest distance can change
+            nearby = np.asarray(tree.query_ball_point(points[current], radius), dtype=int)
+            if len(nearby):
+                new_distances = np.linalg.norm(points[nearby] - points[current], axis=1)
+                distances[nearby] = np.minimum(distances[nearby], new_distances)
+        current = int(np.argmax(distances))
+        radius = distances[current]
+        if radius == 0:
+            # Only duplicate poses left
+            return top_up(selected[: i + 1], len(points), num)
+    return selected
+
+
+def motion_budget_sampling(centres, poses, num, rotation_weight=1.0):
+    """
+    Indices of num frames (in flight order) spaced evenly in cumulative motion: the translation
+    of the normalised camera centres plus rotation_weight times the rotation angle between frames.
+    """
+    translation = np.linalg.norm(np.diff(centres, axis=0), axis=1)
+    R = poses[:, :3, :3]
+    # trace(R_i^T R_i+1) of consecutive rotations
+    traces = np.einsum("nij,nij->n", R[:-1], R[1:])
+    rotation = np.arccos(np.clip((traces - 1) / 2, -1.0, 1.0))
+    cumulative = np.concatenate([[0.0], np.cumsum(translation + rotation_weight * rotation)])
+    if cumulative[-1] == 0:
+        return uniform_sampling(len(poses), num)
+
+    targets = np.linspace(0, cumulative[-1], num)
+    selected = np.unique(np.minimum(np.searchsorted(cumulative, targets), len(poses) - 1))
+    # A single motion step larger than the budget selects the same frame for several targets
+    return top_up(selected, len(poses), num)
+
+
+def uniform_sampling(num_frames, num):
+    return np.linspace(0, num_frames - 1, num, dtype=int)
+
+
+def random_sampling(num_frames, num, seed=None):
+    return np.sort(np.random.default_rng(seed).choice(num_frames, size=num, replace=False))
+
+
+def top_up(selected, num_frames, num):
+    """Add evenly spaced unselected frames to selected until it has num frames."""
+    missing = num - len(selected)
+    if missing <= 0:
+        return selected
+    remaining = np.setdiff1d(np.arange(num_frames), selected)
+    extra = remaining[uniform_sampling(len(remaining), missing)]
+    return np.concatenate([selected, extra])
+
+
+def select_keyframes(poses, percentage, strategy="coverage", rotation_weight=1.0, seed=None):
+    """
+    Indices into poses (N, 4, 4), in flight order, of the keyframes picked by strategy. percentage
+    is the share of the frames to select, in percent.
+    """
+    num_frames = len(poses)
+    num = min(num_frames, max(1, int(round(num_frames * percentage / 100))))
+    if strategy == "uniform":
+        selected = uniform_sampling(num_frames, num)
+    elif strategy == "random":
+        selected = random_sampling(num_frames, num, seed)
+    else:
+        centres, directions = pose_features(poses, rotation_weight)
+        if strategy == "coverage":
+            selected = farthest_point_sampling(np.hstack([centres, directions]), num)
+        elif strategy == "motion":
+            selected = motion_budget_sampling(centres, poses, num, rotation_weight)
+        else:
+            raise ValueError(f"Unknown strategy {strategy}, use one of {STRATEGIES}")
+    return np.unique(selected)
+
+
+def load_flight(json_path, frame_range=None):
+    """Frame numbers (N,) and poses (N, 4, 4) of a transforms file in flight (frame number) order."""
+    index = TransformsIndex.open(json_path)
+    rows = np.argsort(index.frame_nums, kind="stable")
+    if frame_range is not None:
+        first, last = frame_range
+        frame_nums = index.frame_nums[rows]
+        rows = rows[(frame_nums >= first) & (frame_nums <= last)]
+    return index.frame_nums[rows], index.poses[rows]
+
+
+def write_kf_nums(frame_nums, output_path):
+    folder = os.path.dirname(output_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(output_path, "w") as f:
+        f.write("".join(f"{frame_num}\n" for frame_num in frame_nums))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Select keyframes from camera poses.")
+    parser.add_argument(
+        "transforms_json",
+        type=str,
+        help="Transforms file with the poses, e.g. full_transforms.json",
+    )
+    parser.add_argument("output_txt", type=str, help="Output file with one frame number per line")
+    parser.add_argument(
+        "--percentage", type=float, required=True, help="Percentage of the frames to select"
+    )
+    parser.add_argument(
+        "--strategy", type=str, default="coverage", choices=STRATEGIES, help="Selection strategy"
+    )
+    parser.add_argument(
+        "--rotation_weight",
+        type=float,
+        default=1.0,
+        help="Weight of view direction / rotation (radians) against normalised camera translation",
+    )
+    parser.add_argument(
+        "--frames",
+        type=int,
+        nargs=2,
+        default=None,
+        metavar=("FIRST", "LAST"),
+        help="Only select from this range of frame numbers (e.g. to leave out the eval frames)",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the random strategy")
+    args = parser.parse_args()
+
+    frame_nums, poses = load_flight(args.transforms_json, args.frames)
+    selected = select_keyframes(
+        poses, args.percentage, args.strategy, args.rotation_weight, args.seed
+    )
+    write_kf_nums(frame_nums[selected], args.output_txt)
+    print(
+        f"Selected {len(selected)}/{len(frame_nums)} frames ({args.strategy}) to {args.output_txt}"
+    )
@@ -0,0 +1,125 @@
+"""
+Writing camera paths and transforms files, and a binary pose format for our own tools.
+
+JSON is written in one of two modes. The default matches what the pipeline always wrote
+(indent=4, full float precision), which nerfstudio reads and people can diff. The compact mode
+drops the indentation and can round floats to a number of significant digits; it is encoded with
+orjson when that is installed, and with the standard json module otherwise.
+
+The binary pose format stores an (N, 4, 4) float64 pose stack, the (N,) frame numbers and a json
+metadata dict in one file:
+
+    magic (8 bytes) | header length (uint64) | json header | padding | frame numbers | poses
+
+The arrays start at 64-byte aligned offsets, so load_poses can memory-map them without copying.
+"""
+
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+POSES_MAGIC = b"DMPOSES1"
+ALIGNMENT = 64
+
+
+def round_floats(data, precision):
+    """Round every float in nested dicts / lists to precision significant digits."""
+    if isinstance(data, float):
+        return float(f"{data:.{precision}g}")
+    if isinstance(data, dict):
+        return {key: round_floats(value, precision) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [round_floats(value, precision) for value in data]
+    return data
+
+
+def dump_json(data, path, compact=False, precision=None):
+    """
+    Write data to path as json. By default with indent=4, like the pipeline always wrote it. With
+    compact=True without whitespace, using orjson if it is installed. precision rounds floats to
+    that many significant digits in either mode.
+    """
+    if precision is not None:
+        data = round_floats(data, precision)
+    if compact and orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY))
+        return
+    with open(path, "w") as f:
+        if compact:
+            json.dump(data, f, separators=(",", ":"))
+        else:
+            json.dump(data, f, indent=4)
+
+
+def add_serialization_arguments(parser, binary=True):
+    """Add the json output options shared by the camera path and transforms tools to a parser."""
+    parser.add_argument(
+        "--compact", action="store_true", help="Write json without indentation (faster, smaller)"
+    )
+    parser.add_argument(
+        "--precision", type=int, default=None, help="Round floats to this many significant digits"
+    )
+    if binary:
+        parser.add_argument(
+            "--binary",
+            action="store_true",
+            help="Also write the poses to a binary .poses file next to each output json",
+        )
+
+
+def aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save_poses(path, poses, frame_nums, metadata=None):
+    """Write an (N, 4, 4) pose stack, its (N,) frame numbers and a json metadata dict to path."""
+    poses = np.ascontiguousarray(poses, dtype="<f8")
+    frame_nums = np.ascontiguousarray(frame_nums, dtype="<i8")
+    assert poses.shape[1:] == (4, 4), f"Poses must be (N, 4, 4), got {poses.shape}"
+    assert len(frame_nums) == len(poses), "Frame numbers do not match the number of poses"
+
+    header = json.dumps({"count": len(poses), "metadata": metadata or {}}).encode()
+    frame_nums_offset = aligned(len(POSES_MAGIC) + 8 + len(header))
+    poses_offset = aligned(frame_nums_offset + frame_nums.nbytes)
+    with open(path, "wb") as f:
+        f.write(POSES_MAGIC)
+        f.write(np.uint64(len(header)).astype("<u8").tobytes())
+        f.write(header)
+        f.write(b"\0" * (frame_nums_offset - f.tell()))
+        f.write(frame_nums.tobytes())
+        f.write(b"\0" * (poses_offset - f.tell()))
+        f.write(poses.tobytes())
+
+
+def load_poses(path, mmap=True):
+    """
+    Read a file written by save_poses. Returns (poses, frame_nums, metadata); with mmap=True the
+    arrays are read-only memory maps of the file.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(POSES_MAGIC)) != POSES_MAGIC:
+            raise ValueError(f"{path} is not a binary pose file")
+        header_length = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+        header = json.loads(f.read(header_length))
+
+    count = header["count"]
+    frame_nums_offset = aligned(len(POSES_MAGIC) + 8 + header_length)
+    poses_offset = aligned(frame_nums_offset + count * 8)
+    if mmap and count > 0:
+        frame_nums = np.memmap(
+            path, dtype="<i8", mode="r", offset=frame_nums_offset, shape=(count,)
+        )
+        poses = np.memmap(path, dtype="<f8", mode="r", offset=poses_offset, shape=(count, 4, 4))
+    else:
+        with open(path, "rb") as f:
+            f.seek(frame_nums_offset)
+            frame_nums = np.fromfile(f, dtype="<i8", count=count)
+            f.seek(poses_offset)
+            poses = np.fromfile(f, dtype="<f8", count=count * 16).reshape(count, 4, 4)
+    return poses, frame_nums, header["metadata"]
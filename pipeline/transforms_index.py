@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+"""
+Indexed, cached view of a transforms.json file (e.g. full_transforms.json).
+
+The json is parsed once into a table keyed by frame number: every camera pose goes into one
+contiguous (N, 4, 4) float64 array, per-frame fields like file_path into (N,) columns, and the
+intrinsics and other top-level keys are kept separately. The parsed index is saved as a binary
+sidecar (.<name>.index.npz next to the json), with only irregular per-frame fields stored as json,
+and reused until the size or mtime of the json changes. Selecting the frames of a subset is then a
+vectorised lookup instead of a scan over every frame.
+
+Run this file directly to build (or refresh) the sidecar of a transforms file ahead of time.
+"""
+
+import os
+import json
+import argparse
+
+import numpy as np
+
+SIDECAR_SUFFIX = ".index.npz"
+# Bumped whenever the sidecar layout changes, so sidecars of an older layout are rebuilt
+SIDECAR_VERSION = 3
+# Per-frame values of these types are stored as npz columns
+COLUMN_TYPES = (str, int, float, bool)
+
+
+def parse_frame_number(file_path):
+    """Frame number of a frame path like images/frame_00741.jpg, or -1 if it cannot be parsed."""
+    try:
+        return int(file_path.split("/")[-1].split(".")[0].split("_")[-1])
+    except ValueError:
+        return -1
+
+
+def sidecar_path(json_path):
+    folder, filename = os.path.split(json_path)
+    return os.path.join(folder, "." + filename + SIDECAR_SUFFIX)
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return f"{SIDECAR_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def split_frame_fields(frames):
+    """
+    Split the fields of every frame other than transform_matrix into columns and extras. A field
+    is a column, an (N,) array, if every frame has it with a value of the same scalar type (e.g.
+    file_path, colmap_im_id). The remaining fields of each frame go into a list of dicts.
+    """
+    first_keys = [key for key in frames[0] if key != "transform_matrix"] if frames else []
+    columns = {}
+    for key in first_keys:
+        value_type = type(frames[0][key])
+        if value_type not in COLUMN_TYPES:
+            continue
+        values = [frame.get(key) for frame in frames]
+        if any(type(value) is not value_type for value in values):
+            continue
+        try:
+            columns[key] = np.array(values, dtype=None if value_type is not int else np.int64)
+        except OverflowError:
+            continue
+    extras = [
+        {
+            key: value
+            for key, value in frame.items()
+            if key not in columns and key != "transform_matrix"
+        }
+        for frame in frames
+    ]
+    return columns, extras
+
+
+class TransformsIndex:
+    """
+    Parsed transforms file.
+
+    header holds every top-level key except "frames" (intrinsics, camera model, ...). frame_nums is
+    the (N,) array of frame numbers and poses the (N, 4, 4) array of transform matrices, both in file
+    order. The other per-frame fields are held in columns, (N,) arrays of the scalar fields every
+    frame has (file_path, colmap_im_id, ...), and extras, a list with a dict of any other fields of
+    each frame. key_orders and key_order_ids record the key order of every frame, and int_masks and
+    int_mask_ids which matrix entries are integers in the file (e.g. the 0, 0, 0, 1 bottom row), so
+    frames are rebuilt exactly as they appear in the file. Use TransformsIndex.open to get an up to
+    date index.
+    """
+
+    def __init__(
+        self,
+        header,
+        frame_nums,
+        poses,
+        columns,
+        extras,
+        key_orders,
+        key_order_ids,
+        int_masks,
+        int_mask_ids,
+    ):
+        self.header = header
+        self.frame_nums = frame_nums
+        self.poses = poses
+        self.columns = columns
+        self.extras = extras
+        self.key_orders = key_orders
+        self.key_order_ids = key_order_ids
+        self.int_masks = int_masks
+        self.int_mask_ids = int_mask_ids
+        # (i, j) entries to convert back to int, per mask
+        self.int_entries = [np.argwhere(mask).tolist() for mask in int_masks]
+
+    @classmethod
+    def from_json(cls, json_path):
+        with open(json_path, "r") as f:
+            data = json.load(f)
+        frames = data["frames"]
+        header = {key: value for key, value in data.items() if key != "frames"}
+        frame_nums = np.array(
+            [parse_frame_number(frame["file_path"]) for frame in frames], dtype=int
+        )
+        poses = np.array([frame["transform_matrix"] for frame in frames], dtype=np.float64)
+        if poses.shape[1:] != (4, 4):
+            raise ValueError(f"Transform matrices in {json_path} are not 4x4: {poses.shape}")
+        is_int = np.array(
+            [
+                [
+                    [type(value) is int for value in matrix_row]
+                    for matrix_row in frame["transform_matrix"]
+                ]
+                for frame in frames
+            ],
+            dtype=bool,
+        ).reshape(-1, 4, 4)
+        int_masks, int_mask_ids = np.unique(is_int, axis=0, return_inverse=True)
+        columns, extras = split_frame_fields(frames)
+        key_orders = []
+        key_order_ids = np.empty(len(frames), dtype=int)
+        order_ids = {}
+        for row, frame in enumerate(frames):
+            keys = tuple(frame)
+            if keys not in order_ids:
+                order_ids[keys] = len(key_orders)
+                key_orders.append(list(keys))
+            key_order_ids[row] = order_ids[keys]
+        return cls(
+            header,
+            frame_nums,
+            poses.reshape(-1, 4, 4),
+            columns,
+            extras,
+            key_orders,
+            key_order_ids,
+            int_masks,
+            int_mask_ids.reshape(-1),
+        )
+
+    @classmethod
+    def open(cls, json_path):
+        """Load the index of json_path from its sidecar, (re)building the sidecar if it is stale."""
+        signature = file_signature(json_path)
+        path = sidecar_path(json_path)
+        if os.path.exists(path):
+            with np.load(path) as sidecar:
+                if str(sidecar["signature"]) == signature:
+                    column_names = json.loads(str(sidecar["column_names"]))
+                    extras = json.loads(str(sidecar["extras"]))
+                    return cls(
+                        json.loads(str(sidecar["header"])),
+                        sidecar["frame_nums"],
+                        sidecar["poses"],
+                        {name: sidecar[f"column_{i}"] for i, name in enumerate(column_names)},
+                        extras if extras is not None else [{}] * len(sidecar["frame_nums"]),
+                        json.loads(str(sidecar["key_orders"])),
+                        sidecar["key_order_ids"],
+                        sidecar["int_masks"],
+                        sidecar["int_mask_ids"],
+                    )
+
+        index = cls.from_json(json_path)
+        try:
+            index.save(path, signature)
+        except OSError as e:
+            print(f"Warning: could not write transforms index {path}: {e}")
+        return index
+
+    def save(self, path, signature):
+        # Extras are usually all empty, then they are stored as null instead of a list of {}
+        extras = self.extras if any(self.extras) else None
+        # Write to a temporary file and rename it into place, so an interrupted save is never used
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            signature=np.array(signature),
+            header=np.array(json.dumps(self.header)),
+            frame_nums=self.frame_nums,
+            poses=self.poses,
+            column_names=np.array(json.dumps(list(self.columns))),
+            extras=np.array(json.dumps(extras)),
+            key_orders=np.array(json.dumps(self.key_orders)),
+            key_order_ids=self.key_order_ids,
+            int_masks=self.int_masks,
+            int_mask_ids=self.int_mask_ids,
+            **{f"column_{i}": values for i, values in enumerate(self.columns.values())},
+        )
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.frame_nums)
+
+    def rows(self, frame_numbers):
+        """Rows of the frames with the given frame numbers, in file order. Unknown numbers are skipped."""
+        return np.flatnonzero(np.isin(self.frame_nums, np.asarray(frame_numbers, dtype=int)))
+
+    def frame(self, row):
+        """The frame dict of a row, as it appears in the transforms file."""
+        extras = self.extras[row]
+        frame = {}
+        for key in self.key_orders[self.key_order_ids[row]]:
+            if key == "transform_matrix":
+                matrix = self.poses[row].tolist()
+                for i, j in self.int_entries[self.int_mask_ids[row]]:
+                    matrix[i][j] = int(matrix[i][j])
+                frame[key] = matrix
+            elif key in self.columns:
+                frame[key] = self.columns[key][row].item()
+            else:
+                frame[key] = extras[key]
+        return frame
+
+    def frames_data(self, frame_numbers):
+        """The transforms file data restricted to the given frame numbers, as a dictionary."""
+        new_data = dict(self.header)
+        new_data["frames"] = [self.frame(row) for row in self.rows(frame_numbers)]
+        return new_data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the index of a transforms file.")
+    parser.add_argument("json_path", type=str, help="Path to the transforms json file")
+    args = parser.parse_args()
+
+    index = TransformsIndex.open(args.json_path)
+    print(f"Transforms index {sidecar_path(args.json_path)}: {len(index)} frames")